@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Benchmark of the resampling modes of the headless engine.
+
+    python benchmarks/bench_resample.py [--picture photo.jpg] [--repeat 5] [--json out.json]
+
+Times every mode and preset for the ID picture sizes, from a synthetic picture
+(or the given one) at a few source sizes, and compares each result with a
+single-pass Lanczos resize (PSNR in dB, higher is closer).
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageStat
+
+from doublespace import engine
+from doublespace.resample import MODES, PRESETS
+
+SOURCE_SIZES = [1200, 2400, 4000]
+TARGET_SIZES = [300, 450, 600]
+
+
+def synthetic_picture(size):
+    ''' Noise over a gradient: detail at all scales, like a face photo. '''
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 60)
+    return Image.merge('RGB', (gradient, noise, ImageChops.add(gradient, noise, 2.0)))
+
+
+def psnr(a, b):
+    rms = ImageStat.Stat(ImageChops.difference(a, b)).rms
+    mse = sum(value * value for value in rms) / len(rms)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 * 255 / mse)
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        result = function()
+        times.append(time.time() - started)
+    return sorted(times)[len(times) // 2], result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--picture', help='Square picture to use instead of a synthetic one')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    if args.picture:
+        base = engine.load_picture(args.picture)
+    else:
+        base = synthetic_picture(max(SOURCE_SIZES))
+
+    results = []
+    print("%6s %6s %-10s %10s %8s" % ('source', 'target', 'mode', 'ms', 'psnr'))
+    for source_size in SOURCE_SIZES:
+        source = base.resize((source_size, source_size), Image.LANCZOS)
+        for target_size in TARGET_SIZES:
+            target = (target_size, target_size)
+            reference = source.resize(target, Image.LANCZOS)
+            for mode in MODES + sorted(PRESETS):
+                seconds, result = timed(lambda: engine.resize(source, target, mode), args.repeat)
+                quality = psnr(result, reference)
+                results.append({'source': source_size, 'target': target_size, 'mode': mode,
+                                'seconds': seconds, 'psnr': quality})
+                print("%6d %6d %-10s %10.2f %8.2f" % (source_size, target_size, mode, seconds * 1000, quality))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Benchmark of the stages of a headless run, to calibrate the dry-run estimates.
+
+    python benchmarks/bench_stages.py [--picture photo.jpg] [--repeat 5] [--json costs.json]
+
+Times decoding, resizing (a box reduction and a filtered resize), putting
+copies on a sheet and encoding it, per megapixel, on a synthetic photo (or the
+given one).  The JSON file can be passed
+to the dry run with --calibration or DOUBLESPACE_CALIBRATION (see
+doublespace/estimate.py).
+'''
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+from doublespace import engine
+from doublespace import sizes
+from doublespace.plan import layout_plan
+
+from bench_resample import synthetic_picture, timed
+
+SOURCE_SIZE = 2400
+
+
+def photo(size):
+    ''' The synthetic picture, softened to about the detail of a photo. '''
+    return synthetic_picture(size).filter(ImageFilter.GaussianBlur(1.5))
+
+
+def megapixels(size):
+    return size[0] * size[1] / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--picture', help='Picture to use instead of a synthetic one')
+    parser.add_argument('--resample', metavar='MODE', help='Resampling mode of the filtered resize')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Also write the costs to this file')
+    args = parser.parse_args(argv)
+
+    if args.picture:
+        source = engine.load_picture(args.picture)
+    else:
+        source = photo(SOURCE_SIZE)
+    encoded = io.BytesIO()
+    source.save(encoded, 'JPEG', quality=90)
+    encoded = encoded.getvalue()
+    plan = layout_plan('2 x 2', 'A4')
+    sheet_size = (plan.canvass_width, plan.canvass_height)
+
+    def decode():
+        image = Image.open(io.BytesIO(encoded))
+        image.load()
+        return image
+
+    seconds, _ = timed(decode, args.repeat)
+    costs = {'decode': seconds / megapixels(source.size)}
+    # 2400 to 600 pixels is a box reduction only; a 2R copy needs the filter
+    seconds, copy = timed(lambda: engine.prepare_copy(source, plan), args.repeat)
+    costs['reduce'] = seconds / megapixels(source.size)
+    seconds, _ = timed(lambda: engine.resize(source, sizes.picture_pixels('2R'), args.resample),
+                       args.repeat)
+    costs['resize'] = seconds / megapixels(source.size)
+    # Canvasses come from a pool in a run, so the white sheet is not timed
+    sheet = engine.new_canvass(*sheet_size)
+    seconds, sheet = timed(lambda: engine.compose_sheet(copy, plan, sheet), args.repeat)
+    costs['compose'] = seconds / (megapixels(copy.size) * len(plan.positions))
+    seconds, data = timed(lambda: engine.encode_sheet(sheet), args.repeat)
+    costs['encode'] = seconds / megapixels(sheet_size)
+    costs['sheet_bytes'] = len(data) / megapixels(sheet_size)
+
+    for name in sorted(costs):
+        unit = 'bytes/MP' if name == 'sheet_bytes' else 'ms/MP'
+        value = costs[name] if name == 'sheet_bytes' else costs[name] * 1000
+        print("%-12s %12.2f %s" % (name, value, unit))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(costs, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
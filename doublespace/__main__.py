@@ -0,0 +1,287 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Command line entry point: python -m doublespace <command> ... '''
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+
+
+def show_progress(progress):
+    print(progress.describe(), file=sys.stderr)
+
+
+def batch(args):
+    from doublespace.batch import run_orders
+    from doublespace.progress import Progress, interrupt_cancels
+    from doublespace.runs import layout_run
+
+    orders = load_orders(args)
+    if args.dry_run:
+        from doublespace.estimate import estimate_orders
+
+        estimate = estimate_orders(orders, resampling=args.resample, dpi=args.dpi, workers=args.workers,
+                                   memory_budget=args.memory_budget, encoders=args.encoders,
+                                   outputs=args.outputs, max_bytes=args.max_sheet_size,
+                                   calibration=args.calibration)
+        print('\n'.join(estimate.report()))
+        return 0
+    if not os.path.exists(args.outputFolder):
+        os.makedirs(args.outputFolder)
+
+    progress = Progress(show_progress if args.progress else None, args.outputFolder)
+    with layout_run('batch', args.outputFolder, args.profile, args.metrics), \
+            interrupt_cancels(progress, print):
+        saved, failed = run_orders(orders, args.outputFolder, log=print, resampling=args.resample,
+                                   content_names=args.content_names or None,
+                                   durability=args.durability, workers=args.workers,
+                                   memory_budget=args.memory_budget, dpi=args.dpi,
+                                   enhancements=args.enhance, quality=args.quality,
+                                   assemble=args.assemble or None, spool=args.spool,
+                                   spool_jobs=args.spool_jobs, encoders=args.encoders,
+                                   outputs=args.outputs, max_bytes=args.max_sheet_size,
+                                   progress=progress, printer_profile=args.printer_profile,
+                                   intent=args.intent)
+    print("%d orders, %d sheets saved, %d failed" % (len(orders), len(saved), len(failed)))
+    return 1 if failed or progress.stop.is_set() else 0
+
+
+def folder(args):
+    from doublespace.batch import run_folder
+    from doublespace.progress import Progress, interrupt_cancels
+    from doublespace.runs import layout_run
+
+    if args.dry_run:
+        from doublespace.estimate import estimate_folder
+
+        estimate = estimate_folder(args.inputFolder, args.paper, args.picture,
+                                   resampling=args.resample, dpi=args.dpi,
+                                   prefetch=args.prefetch, memory_budget=args.memory_budget,
+                                   outputs=args.outputs, max_bytes=args.max_sheet_size,
+                                   calibration=args.calibration)
+        print('\n'.join(estimate.report()))
+        return 0
+    if not os.path.exists(args.outputFolder):
+        os.makedirs(args.outputFolder)
+
+    progress = Progress(show_progress if args.progress else None, args.outputFolder)
+    with layout_run('folder', args.outputFolder, args.profile, args.metrics), \
+            interrupt_cancels(progress, print):
+        saved, failed = run_folder(args.inputFolder, args.outputFolder, args.paper, args.picture,
+                                   log=print, resampling=args.resample,
+                                   content_names=args.content_names or None,
+                                   durability=args.durability, prefetch=args.prefetch,
+                                   memory_budget=args.memory_budget, dpi=args.dpi,
+                                   enhancements=args.enhance, quality=args.quality,
+                                   spool=args.spool, spool_jobs=args.spool_jobs,
+                                   outputs=args.outputs, max_bytes=args.max_sheet_size,
+                                   progress=progress, printer_profile=args.printer_profile,
+                                   intent=args.intent)
+    print("%d sheets saved, %d pictures failed" % (len(saved), len(failed)))
+    return 1 if failed or progress.stop.is_set() else 0
+
+
+def preview(args):
+    from doublespace.batch import run_previews
+
+    orders = load_orders(args)
+    if not os.path.exists(args.outputFolder):
+        os.makedirs(args.outputFolder)
+
+    saved, failed = run_previews(orders, args.outputFolder, args.dpi, log=print)
+    print("%d orders, %d previews saved, %d failed" % (len(orders), len(saved), len(failed)))
+    return 1 if failed else 0
+
+
+def printer(args):
+    from doublespace.spool import LocalPrinter
+
+    printer = LocalPrinter(args.source, args.rate, args.keep, log=print)
+    try:
+        printer.run(args.idle)
+    except KeyboardInterrupt:
+        pass
+    print("%d sheets printed" % printer.printed)
+    return 0
+
+
+def load_orders(args):
+    ''' Read the order file of args; a missing or bad one is reported like a
+    bad argument.
+    '''
+    from doublespace.orders import read_orders
+
+    try:
+        return read_orders(args.orders)
+    except (IOError, OSError) as err:
+        args.parser.error("can not read %s: %s" % (args.orders, err.strerror or err))
+    except ValueError as err:
+        args.parser.error("%s: %s" % (args.orders, err))
+
+
+def check_run_options(parser, args):
+    ''' Report bad values of the run options given on the command line the way
+    argparse reports other bad arguments, instead of failing in the run.
+    '''
+    from doublespace import sizes
+    from doublespace.budget import parse_size
+    from doublespace.enhance import enhance_steps
+    from doublespace.outputs import output_dpis
+    from doublespace.resample import resample_mode
+
+    checks = [('--dpi', args.dpi, lambda: sizes.sheet_dpi(args.dpi)),
+              ('--outputs', args.outputs, lambda: output_dpis(args.outputs, args.dpi)),
+              ('--resample', args.resample, lambda: resample_mode(args.resample)),
+              ('--enhance', args.enhance, lambda: enhance_steps(args.enhance)),
+              ('--memory-budget', args.memory_budget, lambda: parse_size(args.memory_budget)),
+              ('--max-sheet-size', args.max_sheet_size, lambda: parse_size(args.max_sheet_size)),
+              ('--calibration', args.calibration, lambda: check_calibration(args.calibration)),
+              ('--printer-profile', args.printer_profile, lambda: check_printer_profile(args))]
+    for option, value, check in checks:
+        if value is None:
+            continue
+        try:
+            check()
+        except (IOError, OSError, ValueError) as err:
+            parser.error("argument %s: %s" % (option, err))
+
+
+def check_calibration(path):
+    from doublespace.estimate import cost_model
+
+    try:
+        cost_model(path)
+    except (KeyError, TypeError):
+        raise ValueError("not a costs file written by bench_stages.py: " + path)
+
+
+def check_printer_profile(args):
+    from doublespace import engine
+
+    # Builds or loads the LUT, which the run then reuses
+    engine.printer_lut(args.printer_profile, args.intent)
+
+
+def add_run_options(command):
+    command.set_defaults(parser=command, check=check_run_options)
+    command.add_argument('--dry-run', action='store_true',
+                         help='Only report the sheets, paper, memory and time the run would take')
+    command.add_argument('--progress', action='store_true',
+                         help='Print the pictures and sheets done and the time left to standard error')
+    command.add_argument('--calibration', metavar='PATH',
+                         help='Costs for --dry-run measured by benchmarks/bench_stages.py --json')
+    command.add_argument('--profile', nargs='?', const='cprofile', metavar='MODE',
+                         help='Profile the run (cprofile or sample), see doublespace/profiling.py')
+    command.add_argument('--metrics', metavar='PATH',
+                         help='Add the run to this .prom or .json metrics snapshot')
+    command.add_argument('--resample', metavar='MODE',
+                         help='Resampling mode (nearest, box, bilinear, bicubic, lanczos) or preset (fast, quality)')
+    command.add_argument('--content-names', action='store_true',
+                         help='Name sheets after a hash of their contents')
+    command.add_argument('--durability', choices=['file', 'batch', 'none'],
+                         help='fsync every sheet, all sheets at the end (default) or never')
+    command.add_argument('--dpi', type=int, metavar='DPI',
+                         help='Render sheets at DPI (default 300, e.g. 600 for final prints)')
+    command.add_argument('--outputs', metavar='DPIS',
+                         help='Also save every sheet at these lower resolutions, e.g. 300,40')
+    command.add_argument('--max-sheet-size', metavar='SIZE',
+                         help='Lower the JPEG quality of sheets larger than SIZE bytes (e.g. 2M)')
+    command.add_argument('--enhance', metavar='STEPS',
+                         help='Enhance the copies: balance, levels, sharpen (comma separated) or all')
+    command.add_argument('--printer-profile', metavar='ICC',
+                         help='Convert the copies from sRGB to this RGB printer profile')
+    command.add_argument('--intent', choices=['perceptual', 'relative', 'saturation', 'absolute'],
+                         help='Rendering intent for --printer-profile (default perceptual)')
+    command.add_argument('--quality', choices=['off', 'flag', 'reject'],
+                         help='Check pictures for blur and exposure and flag or reject bad ones')
+    command.add_argument('--memory-budget', metavar='SIZE',
+                         help='Keep decoded pictures and sheets below SIZE bytes (e.g. 512M)')
+    command.add_argument('--spool', metavar='TARGET',
+                         help='Send the sheets to pipe:PATH, dir:PATH or command:CMD instead of saving them')
+    command.add_argument('--spool-jobs', type=int, metavar='N',
+                         help='Wait while N sheets wait in the spool folder (default 4)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m doublespace')
+    commands = parser.add_subparsers(dest='command')
+
+    command = commands.add_parser('batch', help='Render every order of an order file')
+    command.add_argument('orders', help='CSV or JSON order file')
+    command.add_argument('outputFolder', help='Folder in which to save the sheets')
+    command.add_argument('--workers', type=int, default=1, metavar='N',
+                         help='Decode up to N pictures ahead on worker threads (default 1)')
+    command.add_argument('--encoders', type=int, metavar='N',
+                         help='Encode sheets on N processes from shared memory (default 0, none)')
+    command.add_argument('--assemble', action='store_true',
+                         help='Put sheets together from one encoded copy (faster, larger files)')
+    add_run_options(command)
+    command.set_defaults(run=batch)
+
+    command = commands.add_parser('preview', help='Save low resolution previews of the sheets of an order file')
+    command.add_argument('orders', help='CSV or JSON order file')
+    command.add_argument('outputFolder', help='Folder in which to save the previews')
+    command.add_argument('--dpi', type=int, default=150, metavar='DPI',
+                         help='Preview resolution, 72 to 150 (default 150)')
+    command.set_defaults(run=preview, parser=command)
+
+    command = commands.add_parser('folder', help='Lay out every picture of a folder, one copy each')
+    command.add_argument('inputFolder', help='Folder or ZIP/tar archive with the pictures')
+    command.add_argument('outputFolder', help='Folder in which to save the sheets')
+    command.add_argument('--paper', default='4R', help='Paper size (default 4R)')
+    command.add_argument('--picture', default='2R', help='Picture size (default 2R)')
+    command.add_argument('--prefetch', type=int, metavar='N',
+                         help='Decode the next N pictures ahead (default 2, 0 to turn off)')
+    add_run_options(command)
+    command.set_defaults(run=folder)
+
+    command = commands.add_parser('printer', help='Stand-in printer for testing a spool target')
+    command.add_argument('source', help='Spool folder, named pipe or - for standard input')
+    command.add_argument('--rate', type=float, metavar='PPM',
+                         help='Pages per minute (default 20)')
+    command.add_argument('--keep', metavar='FOLDER', help='Keep the printed sheets in FOLDER')
+    command.add_argument('--idle', type=float, metavar='SECONDS',
+                         help='Stop when the spool folder stayed empty for SECONDS')
+    command.set_defaults(run=printer)
+
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'run'):
+        parser.print_help()
+        return 2
+    if hasattr(args, 'check'):
+        args.check(args.parser, args)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,766 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Batch rendering of order files.
+
+All orders of a run share one SheetRenderer, so a picture that appears in
+several orders is decoded once, and an order for several copies is encoded once.
+run_folder lays out the pictures of a folder, one copy each, like the
+multi_images_2R plugin.
+
+Pictures are decoded ahead on worker threads.  Everything kept in memory is
+charged to a MemoryBudget (see budget.py), which holds the workers back when
+the budget is used up.
+'''
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+from doublespace import engine
+from doublespace import metrics
+from doublespace import sizes
+from doublespace.assemble import MCU, assemble_sheet, assembly_enabled
+from doublespace.budget import MemoryBudget
+from doublespace.compression import max_sheet_bytes, oversize_warning
+from doublespace.enhance import enhance_steps
+from doublespace.inputs import ARCHIVE_ERRORS, open_pictures
+from doublespace.naming import SheetNamer
+from doublespace.output import SheetWriter
+from doublespace.outputs import output_dpis, output_path
+from doublespace.plan import aligned_plan, layout_plan, scaled_plan
+from doublespace.pool import CanvassPool
+from doublespace.prefetch import Prefetcher, wanted
+from doublespace.progress import Progress
+from doublespace.quality import QualityReport
+from doublespace.shared import SharedCanvass, SheetEncoder, encoder_count
+from doublespace.spool import spool_sink
+from doublespace.preview import DEFAULT_DPI, preview_dpi
+
+# Files run_folder lays out, the same the multi_images_2R plugin opens
+PICTURE_EXTENSIONS = ('.png', '.jpeg', '.jpg')
+
+# Pictures and sheets a SheetRenderer keeps; four times as many copies
+CACHE_SIZE = 8
+
+
+class _Cache(object):
+    ''' Small least recently used cache.
+
+    Values can be given a weight in bytes, which is charged to budget while
+    they are kept; the budget can ask the cache to drop its oldest values.
+    '''
+
+    def __init__(self, size, budget=None):
+        self.size = size
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        if budget is not None:
+            budget.add_reclaimer(self.reclaim)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def get(self, key, make, weigh=None):
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item is not None:
+                self.items[key] = item
+                return item[0]
+        value = make()
+        weight = weigh(value) if weigh is not None else 0
+        if weight and self.budget is not None:
+            self.budget.charge(weight)
+        self.put(key, value, weight)
+        return value
+
+    def put(self, key, value, weight=0):
+        ''' Keep value; weight bytes already taken from the budget are given back when it is dropped. '''
+        with self.lock:
+            dropped = [self.items.pop(key)] if key in self.items else []
+            self.items[key] = (value, weight)
+            while len(self.items) > self.size:
+                dropped.append(self.items.popitem(last=False)[1])
+        self._release(dropped)
+
+    def reclaim(self, amount):
+        ''' Drop the oldest values until amount bytes are freed; returns the bytes freed. '''
+        dropped = []
+        freed = 0
+        with self.lock:
+            while self.items and freed < amount:
+                item = self.items.popitem(last=False)[1]
+                dropped.append(item)
+                freed = freed + item[1]
+        self._release(dropped)
+        return freed
+
+    def _release(self, dropped):
+        if self.budget is not None:
+            for value, weight in dropped:
+                if weight:
+                    self.budget.release(weight)
+
+
+# Function to run the enhancement steps on a copy, timed as the enhance stage
+def enhance_tile(copy, steps):
+    if not steps:
+        return copy
+    with metrics.stage('enhance'):
+        return engine.enhance_copy(copy, steps)
+
+
+# Function to convert a copy to the printer's colors, timed as the color stage
+def color_tile(copy, lut):
+    if lut is None:
+        return copy
+    with metrics.stage('color'):
+        return engine.convert_copy(copy, lut)
+
+
+def _image_weight(image):
+    return engine.image_bytes(*image.size)
+
+
+def _saved(writer, outputPath, note=''):
+    if writer.spool is not None:
+        return "Spooled " + os.path.basename(outputPath) + " to " + repr(writer.spool) + note
+    return "Saved " + outputPath + note
+
+
+def _fitted(quality, data):
+    return " (quality %d, %d KB)" % (quality, (len(data) + 1023) // 1024)
+
+
+def _warn_oversize(log, outputPath, data, quality, max_bytes):
+    warning = oversize_warning(os.path.basename(outputPath), len(data), quality, max_bytes)
+    if warning:
+        log(warning)
+
+
+class QualityGate(object):
+    ''' Scores every picture once (see quality.py) and keeps the report.
+
+    Parameters:
+    outputFolder : string The folder the report is written to.
+    mode : string 'off', 'flag' or 'reject'; None reads DOUBLESPACE_QUALITY.
+    '''
+
+    def __init__(self, outputFolder, mode=None):
+        self.report = QualityReport(outputFolder, mode)
+        self.mode = self.report.mode
+        self.lock = threading.Lock()
+        self.found = {}
+
+    def check(self, source, picture=None):
+        ''' Score source unless done before and return its problems.  Raises
+        QualityError for a picture with problems if bad pictures are rejected.
+        picture is an open file to read source from, e.g. an archive member;
+        it is rewound afterwards.  Called on worker threads.
+        '''
+        if self.mode == 'off':
+            return []
+        with self.lock:
+            found = self.found.get(source)
+        if found is None:
+            with metrics.stage('score', failure='unreadable'):
+                score = engine.score_picture(source if picture is None else picture)
+                if picture is not None:
+                    picture.seek(0)
+            with self.lock:
+                found = self.found.setdefault(source, self.report.add(source, score))
+        if found and self.mode == 'reject':
+            raise engine.QualityError(source + ": rejected as " + ', '.join(found))
+        return found
+
+    def close(self):
+        self.report.write()
+
+
+class SheetRenderer(object):
+    ''' Renders encoded sheets, keeping decoded pictures, resized copies and
+    encoded sheets of the most recent orders.  Sheets are drawn on canvasses
+    from a pool, so only the areas covered by copies are cleared between sheets.
+
+    Parameters:
+    cache_size : int How many decoded pictures and encoded sheets to keep.
+    resampling : string Resampling mode or preset, see resample.py.
+    budget : MemoryBudget The budget to charge kept images to.
+    dpi : int Resolution to render sheets at, see sizes.sheet_dpi.
+    enhancements : string Enhancement steps for the copies, see enhance.py.
+    assemble : bool Put sheets together from encoded blocks, see assemble.py.
+    encoders : int How many processes encode sheets, see shared.py.
+    outputs : string Extra, lower resolutions to render sheets at, see outputs.py.
+    max_bytes : int or string Maximum size of a sheet, see compression.py.
+    printer_profile, intent : string Printer profile and rendering intent to
+        convert the copies for, see color.py.
+    '''
+
+    def __init__(self, cache_size=CACHE_SIZE, resampling=None, budget=None, dpi=None, enhancements=None,
+                 assemble=None, encoders=None, outputs=None, max_bytes=None, printer_profile=None,
+                 intent=None):
+        self.resampling = resampling
+        self.assemble = assembly_enabled(assemble)
+        self.enhancements = enhance_steps(enhancements)
+        self.lut = engine.printer_lut(printer_profile, intent)
+        self.dpi = sizes.sheet_dpi(dpi)
+        self.outputs = output_dpis(outputs, self.dpi)
+        self.max_bytes = max_sheet_bytes(max_bytes)
+        # JPEG quality every sheet was encoded at
+        self.qualities = {}
+        self.budget = budget or MemoryBudget()
+        self.plans = {}
+        self.pictures = _Cache(cache_size, self.budget)
+        self.copies = _Cache(cache_size * 4, self.budget)
+        self.sheets = _Cache(cache_size, self.budget)
+        encoders = encoder_count(encoders)
+        # Assembled sheets are encoded faster than they could be handed over
+        self.encoder = SheetEncoder(encoders) if encoders and not self.assemble else None
+        self.canvasses = CanvassPool(self.new_canvass, self.clear_canvass, self.discard_canvass)
+        self.budget.add_reclaimer(self.reclaim_canvasses)
+
+    def new_canvass(self, width, height):
+        self.budget.charge(engine.image_bytes(width, height))
+        if self.encoder is not None:
+            # In shared memory, for the encoder processes
+            return SharedCanvass(width, height)
+        return engine.new_canvass(width, height)
+
+    def clear_canvass(self, canvass, boxes=None):
+        engine.clear_canvass(getattr(canvass, 'image', canvass), boxes)
+
+    def discard_canvass(self, canvass):
+        self.budget.release(engine.image_bytes(*canvass.size))
+        if isinstance(canvass, SharedCanvass):
+            canvass.close()
+
+    def reclaim_canvasses(self, amount):
+        used = self.budget.used
+        self.canvasses.close()
+        return max(0, used - self.budget.used)
+
+    def close(self):
+        self.canvasses.close()
+        for cache in (self.pictures, self.copies, self.sheets):
+            cache.reclaim(self.budget.used)
+        if self.encoder is not None:
+            self.encoder.close()
+
+    def plan(self, picture_size, paper_size):
+        key = (picture_size, paper_size)
+        if key not in self.plans:
+            plan = layout_plan(picture_size, paper_size, self.dpi)
+            if self.assemble:
+                # Copies on the MCU grid share their encoded blocks
+                plan = aligned_plan(plan, MCU)
+            self.plans[key] = plan
+        return self.plans[key]
+
+    def decode(self, source):
+        with metrics.stage('load', failure='unreadable'):
+            image = engine.load_picture(source)
+        metrics.image_read()
+        return image
+
+    def prefetch(self, order):
+        ''' Decode the picture of order ahead, once its memory fits in the budget.
+        Called on worker threads.
+        '''
+        plan = self.plan(order.picture_size, order.paper_size)
+        if order.source in self.pictures or (order.source, plan.picture_size) in self.copies:
+            return
+        with metrics.stage('probe', failure='unreadable'):
+            weight = engine.picture_footprint(order.source)
+        self.budget.acquire(weight, wanted())
+        try:
+            image = self.decode(order.source)
+        except Exception:
+            self.budget.release(weight)
+            raise
+        self.pictures.put(order.source, image, weight)
+
+    def picture(self, source):
+        return self.pictures.get(source, lambda: self.decode(source), _image_weight)
+
+    def copy(self, source, plan):
+        def resize():
+            picture = self.picture(source)
+            with metrics.stage('resize'):
+                copy = engine.prepare_copy(picture, plan, self.resampling)
+            return color_tile(enhance_tile(copy, self.enhancements), self.lut)
+        return self.copies.get((source, plan.picture_size), resize, _image_weight)
+
+    def sheet(self, order):
+        ''' Return the encoded JPEG sheet for order. '''
+        plan = self.plan(order.picture_size, order.paper_size)
+        key = (order.source, plan.picture_size, plan.paper_size)
+
+        def render():
+            copy = self.copy(order.source, plan)
+            if self.assemble:
+                with metrics.stage('encode', failure='encode'):
+                    data = assemble_sheet(copy, plan, engine.JPEG_QUALITY)
+                # Too large sheets are encoded again from a canvass
+                if data is not None and (self.max_bytes is None or len(data) <= self.max_bytes):
+                    self.qualities[key] = engine.JPEG_QUALITY
+                    return data
+            canvass = self.canvasses.acquire(plan.canvass_width, plan.canvass_height)
+            # A SharedCanvass holds its image
+            image = getattr(canvass, 'image', canvass)
+            try:
+                with metrics.stage('compose'):
+                    engine.compose_sheet(copy, plan, image)
+                with metrics.stage('encode', failure='encode'):
+                    data, self.qualities[key] = engine.encode_to_size(image, self.max_bytes, dpi=plan.dpi)
+                return data
+            finally:
+                image = None
+                self.canvasses.release(canvass, engine.copy_boxes(copy, plan))
+
+        return self.sheets.get(key, render, len)
+
+    def sheet_quality(self, order):
+        ''' Return the JPEG quality the sheet for order was encoded at. '''
+        plan = self.plan(order.picture_size, order.paper_size)
+        return self.qualities.get((order.source, plan.picture_size, plan.paper_size),
+                                  engine.JPEG_QUALITY)
+
+    def scaled_sheets(self, order):
+        ''' Return [(dpi, encoded JPEG)] of the sheet for order at every extra
+        output resolution.  The copies are resized from the full size copy.
+        '''
+        plan = self.plan(order.picture_size, order.paper_size)
+        sheets = []
+        for dpi in self.outputs:
+            def render(dpi=dpi):
+                small = scaled_plan(plan, dpi * 1.0 / plan.dpi)
+                copy = self.copy(order.source, plan)
+                with metrics.stage('resize'):
+                    copy = engine.scale_copy(copy, dpi * 1.0 / plan.dpi, self.resampling)
+                with metrics.stage('compose'):
+                    canvass = engine.compose_sheet(copy, small)
+                with metrics.stage('encode', failure='encode'):
+                    return engine.encode_sheet(canvass, dpi=dpi)
+            key = (order.source, plan.picture_size, plan.paper_size, dpi)
+            sheets.append((dpi, self.sheets.get(key, render, len)))
+        return sheets
+
+    def submit(self, order):
+        ''' Start the sheet for order and return a function that returns the
+        encoded JPEG.  With encoder processes the sheet is encoded in the
+        meantime, while the next ones are composed.
+        '''
+        plan = self.plan(order.picture_size, order.paper_size)
+        key = (order.source, plan.picture_size, plan.paper_size)
+        if self.encoder is None or key in self.sheets:
+            data = self.sheet(order)
+            return lambda: data
+
+        copy = self.copy(order.source, plan)
+        canvass = self.canvasses.acquire(plan.canvass_width, plan.canvass_height)
+        boxes = engine.copy_boxes(copy, plan)
+        try:
+            with metrics.stage('compose'):
+                engine.compose_sheet(copy, plan, canvass.image)
+            future = self.encoder.submit(canvass, dpi=plan.dpi, max_bytes=self.max_bytes)
+        except Exception:
+            self.canvasses.release(canvass, boxes)
+            raise
+
+        def result():
+            try:
+                # Waiting for the encoder
+                with metrics.stage('encode', failure='encode'):
+                    data, self.qualities[key] = future.result()
+            finally:
+                self.canvasses.release(canvass, boxes)
+            self.budget.charge(len(data))
+            self.sheets.put(key, data, len(data))
+            return data
+
+        return result
+
+
+def run_orders(orders, outputFolder, log=None, resampling=None, content_names=None, durability=None,
+               workers=1, memory_budget=None, dpi=None, enhancements=None, quality=None,
+               assemble=None, spool=None, spool_jobs=None, encoders=None, outputs=None,
+               max_bytes=None, progress=None, printer_profile=None, intent=None):
+    ''' Render every order into outputFolder.
+
+    Orders that fail are reported through log and skipped.
+
+    Parameters:
+    orders : list Order tuples (see orders.read_orders).
+    outputFolder : string The folder in which to save the sheets.
+    log : function Called with a message for every saved sheet and failure.
+    resampling : string Resampling mode or preset, see resample.py.
+    content_names : bool Name sheets after their contents, see naming.py.
+    durability : string When to flush sheets to disk, see output.py.
+    workers : int How many pictures to decode ahead on worker threads.
+    memory_budget : int or string Memory budget, see budget.py.
+    dpi : int Resolution to render sheets at, see sizes.sheet_dpi.
+    enhancements : string Enhancement steps for the copies, see enhance.py.
+    quality : string What to do with blurry or badly exposed pictures, see quality.py.
+    assemble : bool Put sheets together from encoded blocks, see assemble.py.
+    spool, spool_jobs : string, int Print spool to send the sheets to, see spool.py.
+    encoders : int How many processes encode sheets, see shared.py.
+    outputs : string Extra, lower resolutions to save sheets at, see outputs.py.
+    max_bytes : int or string Maximum size of a sheet, see compression.py.
+    progress : Progress Reports the orders done and stops the run when cancelled,
+        see progress.py.
+    printer_profile, intent : string Printer profile and rendering intent to
+        convert the copies for, see color.py.
+
+    Returns a tuple (list of saved paths, list of (order, error message)).
+    '''
+    log = log or (lambda message: None)
+    progress = progress or Progress(outputFolder=outputFolder)
+    progress.start(len(orders))
+    renderer = SheetRenderer(resampling=resampling, budget=MemoryBudget(memory_budget), dpi=dpi,
+                             enhancements=enhancements, assemble=assemble, encoders=encoders,
+                             outputs=outputs, max_bytes=max_bytes, printer_profile=printer_profile,
+                             intent=intent)
+    gate = QualityGate(outputFolder, quality)
+    namer = SheetNamer(outputFolder, content=content_names)
+    writer = SheetWriter(durability, spool_sink(spool, spool_jobs))
+    # Other resolutions are saved in outputFolder, also when the sheets are spooled
+    archive = SheetWriter(durability) if writer.spool is not None else writer
+    saved = []
+    failed = []
+
+    def prefetch(order):
+        gate.check(order.source)
+        renderer.prefetch(order)
+
+    def start(order, loaded):
+        loaded.get()
+        found = gate.check(order.source)
+        if found:
+            log(order.source + ": flagged as " + ', '.join(found))
+        return renderer.submit(order)
+
+    def save(order, result):
+        data = result()
+        # The quality is only worth a mention when it may have been lowered
+        note = _fitted(renderer.sheet_quality(order), data) if renderer.max_bytes else ''
+        paths = []
+        for copy_number in range(1, order.copies + 1):
+            outputPath = namer.next_path(data, copy_number)
+            with metrics.stage('save'):
+                writer.write(data, outputPath)
+            metrics.sheet_written(outputPath, len(data))
+            saved.append(outputPath)
+            log(_saved(writer, outputPath, note))
+            _warn_oversize(log, outputPath, data, renderer.sheet_quality(order), renderer.max_bytes)
+            paths.append(outputPath)
+        for dpi, scaled in renderer.scaled_sheets(order):
+            outputPath = output_path(os.path.join(outputFolder, os.path.basename(paths[0])), dpi)
+            with metrics.stage('save'):
+                archive.write(scaled, outputPath)
+            metrics.sheet_written(outputPath, len(scaled))
+            saved.append(outputPath)
+            log("Saved " + outputPath)
+        return len(paths)
+
+    def attempt(order, work, *args):
+        try:
+            return work(order, *args)
+        except engine.LayoutError as err:
+            metrics.failure('aspect')
+            failed.append((order, str(err)))
+            log(order.source + ": " + str(err))
+        except engine.QualityError as err:
+            metrics.failure('quality')
+            failed.append((order, str(err)))
+            log(str(err))
+        except (IOError, OSError) as err:
+            metrics.unexpected(err)
+            failed.append((order, str(err)))
+            log(order.source + ": " + str(err))
+
+    # Sheets being encoded by the encoder processes, saved in order
+    encoding = deque()
+    window = renderer.encoder.processes if renderer.encoder is not None else 0
+
+    def finish(order, result):
+        progress.done(1, attempt(order, save, result) or 0)
+
+    try:
+        cancelled = False
+        for order, loaded in Prefetcher(orders, prefetch, workers):
+            # Sheets already started are still saved
+            cancelled = progress.cancelled
+            if cancelled:
+                break
+            result = attempt(order, start, loaded)
+            if result is not None:
+                encoding.append((order, result))
+            else:
+                progress.done()
+            while len(encoding) > window:
+                finish(*encoding.popleft())
+        while encoding:
+            finish(*encoding.popleft())
+        if cancelled:
+            log("Cancelled after %d of %d orders" % (progress.pictures, len(orders)))
+    finally:
+        # After an unexpected error the sheets still being encoded are waited
+        # for, so their canvasses go back to the pool and are discarded with it
+        while encoding:
+            try:
+                encoding.popleft()[1]()
+            except Exception:
+                pass
+        renderer.close()
+        gate.close()
+        writer.close()
+        if archive is not writer:
+            archive.close()
+    return saved, failed
+
+
+def run_previews(orders, outputFolder, dpi=DEFAULT_DPI, log=None):
+    ''' Save a low resolution preview (see preview.py) of the sheet of every
+    order into outputFolder, so they can be checked before the full run.
+
+    Returns a tuple (list of saved paths, list of (order, error message)).
+    '''
+    log = log or (lambda message: None)
+    dpi = preview_dpi(dpi) or DEFAULT_DPI
+    plans = {}
+    namer = SheetNamer(outputFolder, prefix='doublespace_preview')
+    writer = SheetWriter('none')
+    saved = []
+    failed = []
+
+    for order in orders:
+        try:
+            key = (order.picture_size, order.paper_size)
+            if key not in plans:
+                plans[key] = layout_plan(order.picture_size, order.paper_size)
+            with metrics.stage('preview', failure='unreadable'):
+                data = engine.render_preview(order.source, plans[key], dpi)
+            outputPath = namer.next_path(data)
+            writer.write(data, outputPath)
+            saved.append(outputPath)
+            log("Preview " + outputPath + " of " + order.source)
+        except engine.LayoutError as err:
+            metrics.failure('aspect')
+            failed.append((order, str(err)))
+            log(order.source + ": " + str(err))
+        except (IOError, OSError) as err:
+            metrics.unexpected(err)
+            failed.append((order, str(err)))
+            log(order.source + ": " + str(err))
+
+    writer.close()
+    return saved, failed
+
+
+def run_folder(inputFolder, outputFolder, paper_size='4R', picture_size='2R', log=None,
+               resampling=None, content_names=None, durability=None, prefetch=None,
+               memory_budget=None, dpi=None, enhancements=None, quality=None, spool=None,
+               spool_jobs=None, outputs=None, max_bytes=None, progress=None, printer_profile=None,
+               intent=None):
+    ''' Lay out every picture of inputFolder, one copy each, on as many sheets
+    as needed.  The next pictures are decoded on background threads while the
+    current one is resized and put on its sheet.
+
+    Parameters:
+    inputFolder : string The folder or archive with the pictures, taken in name
+        order, see inputs.py.
+    outputFolder : string The folder in which to save the sheets.
+    paper_size, picture_size : string Sizes as in sizes.py.
+    log : function Called with a message for every saved sheet and failure.
+    resampling : string Resampling mode or preset, see resample.py.
+    content_names : bool Name sheets after their contents, see naming.py.
+    durability : string When to flush sheets to disk, see output.py.
+    prefetch : int How many pictures to decode ahead, see prefetch.py.
+    memory_budget : int or string Memory budget, see budget.py.
+    dpi : int Resolution to render sheets at, see sizes.sheet_dpi.
+    enhancements : string Enhancement steps for the copies, see enhance.py.
+    quality : string What to do with blurry or badly exposed pictures, see quality.py.
+    spool, spool_jobs : string, int Print spool to send the sheets to, see spool.py.
+    outputs : string Extra, lower resolutions to save sheets at, see outputs.py.
+    max_bytes : int or string Maximum size of a sheet, see compression.py.
+    progress : Progress Reports the pictures done and stops the run when
+        cancelled, see progress.py.  The sheet being filled is saved.
+    printer_profile, intent : string Printer profile and rendering intent to
+        convert the copies for, see color.py.
+
+    Returns a tuple (list of saved paths, list of (path, error message)).
+    '''
+    log = log or (lambda message: None)
+    plan = layout_plan(picture_size, paper_size, dpi)
+    # Smaller sheets for the other resolutions, filled along with the sheet
+    scaled = [(output_dpi, scaled_plan(plan, output_dpi * 1.0 / plan.dpi))
+              for output_dpi in output_dpis(outputs, plan.dpi)]
+    enhancements = enhance_steps(enhancements)
+    lut = engine.printer_lut(printer_profile, intent)
+    max_bytes = max_sheet_bytes(max_bytes)
+    gate = QualityGate(outputFolder, quality)
+    budget = MemoryBudget(memory_budget)
+    namer = SheetNamer(outputFolder, content=content_names)
+    writer = SheetWriter(durability, spool_sink(spool, spool_jobs))
+    archive = SheetWriter(durability) if writer.spool is not None else writer
+    saved = []
+    failed = []
+    state = {'canvass': None, 'boxes': [], 'scaled': [], 'sheets': 0}
+
+    # The sheet is charged once for the whole run
+    budget.charge(engine.image_bytes(plan.canvass_width, plan.canvass_height))
+    canvasses = CanvassPool(engine.new_canvass, engine.clear_canvass)
+
+    def load(path):
+        ''' Decode path once it fits in the budget; the budget is given back
+        when the picture is on its sheet. '''
+        try:
+            with metrics.stage('probe', failure='unreadable'):
+                picture = pictures.open(path)
+            with picture:
+                gate.check(path, picture)
+                with metrics.stage('probe', failure='unreadable'):
+                    weight = engine.picture_footprint(picture)
+                    picture.seek(0)
+                budget.acquire(weight, wanted())
+                try:
+                    with metrics.stage('load', failure='unreadable'):
+                        return engine.load_picture(picture), weight
+                except Exception:
+                    budget.release(weight)
+                    raise
+        except ARCHIVE_ERRORS as err:
+            # A damaged archive member fails like an unreadable file
+            raise IOError(str(err))
+
+    def save_sheet():
+        canvass = state['canvass']
+        try:
+            with metrics.stage('encode', failure='encode'):
+                data, sheet_quality = engine.encode_to_size(canvass, max_bytes, dpi=plan.dpi)
+            outputPath = namer.next_path(data)
+            with metrics.stage('save'):
+                writer.write(data, outputPath)
+            metrics.sheet_written(outputPath, len(data))
+            saved.append(outputPath)
+            state['sheets'] += 1
+            log(_saved(writer, outputPath, _fitted(sheet_quality, data) if max_bytes else ''))
+            _warn_oversize(log, outputPath, data, sheet_quality, max_bytes)
+            for (output_dpi, small), small_canvass in zip(scaled, state['scaled']):
+                with metrics.stage('encode', failure='encode'):
+                    data = engine.encode_sheet(small_canvass, dpi=output_dpi)
+                smallPath = output_path(os.path.join(outputFolder, os.path.basename(outputPath)), output_dpi)
+                with metrics.stage('save'):
+                    archive.write(data, smallPath)
+                metrics.sheet_written(smallPath, len(data))
+                saved.append(smallPath)
+                log("Saved " + smallPath)
+        finally:
+            canvasses.release(canvass, state['boxes'])
+            state['canvass'] = None
+            state['boxes'] = []
+            state['scaled'] = []
+
+    pictures = None
+    try:
+        pictures = open_pictures(inputFolder)
+        paths = pictures.names(PICTURE_EXTENSIONS)
+        progress = progress or Progress(outputFolder=outputFolder)
+        progress.start(len(paths))
+
+        for path, loaded in Prefetcher(paths, load, prefetch):
+            if progress.cancelled:
+                log("Cancelled after %d of %d pictures" % (progress.pictures, len(paths)))
+                break
+            sheets = state['sheets']
+            try:
+                picture, weight = loaded.take()
+                found = gate.check(path)
+                if found:
+                    log(path + ": flagged as " + ', '.join(found))
+                metrics.image_read()
+                try:
+                    with metrics.stage('resize'):
+                        copy = engine.prepare_copy(picture, plan, resampling)
+                finally:
+                    picture = None
+                    budget.release(weight)
+                copy = color_tile(enhance_tile(copy, enhancements), lut)
+
+                if state['canvass'] is None:
+                    state['canvass'] = canvasses.acquire(plan.canvass_width, plan.canvass_height)
+                    state['scaled'] = [engine.new_canvass(small.canvass_width, small.canvass_height)
+                                       for output_dpi, small in scaled]
+                index = len(state['boxes'])
+                x, y = plan.positions[index]
+                with metrics.stage('compose'):
+                    state['canvass'].paste(copy, (x, y))
+                state['boxes'].append((x, y, x + copy.size[0], y + copy.size[1]))
+                for (output_dpi, small), small_canvass in zip(scaled, state['scaled']):
+                    with metrics.stage('resize'):
+                        small_copy = engine.scale_copy(copy, output_dpi * 1.0 / plan.dpi, resampling)
+                    with metrics.stage('compose'):
+                        small_canvass.paste(small_copy, small.positions[index])
+
+                if len(state['boxes']) == len(plan.positions):
+                    save_sheet()
+            except engine.LayoutError as err:
+                metrics.failure('aspect')
+                failed.append((path, str(err)))
+                log(path + ": " + str(err))
+            except engine.QualityError as err:
+                metrics.failure('quality')
+                failed.append((path, str(err)))
+                log(str(err))
+            except (IOError, OSError) as err:
+                metrics.unexpected(err)
+                failed.append((path, str(err)))
+                log(path + ": " + str(err))
+            progress.done(1, state['sheets'] - sheets)
+
+        try:
+            # The last sheet is saved even if it is not full
+            if state['canvass'] is not None:
+                save_sheet()
+        except (IOError, OSError) as err:
+            metrics.unexpected(err)
+            failed.append((None, str(err)))
+            log(str(err))
+    finally:
+        canvasses.close()
+        if pictures is not None:
+            pictures.close()
+        gate.close()
+        writer.close()
+        if archive is not writer:
+            archive.close()
+    return saved, failed
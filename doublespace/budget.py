@@ -0,0 +1,148 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Memory budget for the headless engine.
+
+Decoded pictures, resized copies and canvasses are charged to a MemoryBudget
+by their estimated size in bytes.  Threads that decode pictures ahead wait in
+acquire() until the pictures already in memory have been used, so a run with
+several workers stays below the budget; the thread that lays out the sheets
+only charges what it uses and never waits, and the picture it is waiting for
+is always let in, so the run always makes progress.
+Before anyone waits, the caches are asked to give memory back.
+
+The budget comes from the memory_budget argument or DOUBLESPACE_MEMORY_BUDGET,
+in bytes or with a K, M or G suffix (e.g. 512M).  Without either there is no
+limit and the budget only keeps count.
+'''
+
+import os
+import threading
+
+BUDGET_ENV = 'DOUBLESPACE_MEMORY_BUDGET'
+
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(text):
+    ''' Return the number of bytes in text, e.g. 1048576, 512M or 2G.
+
+    Raises ValueError if text is not a size.
+    '''
+    size = str(text).strip().upper().rstrip('B')
+    try:
+        if size and size[-1] in UNITS:
+            return int(float(size[:-1]) * UNITS[size[-1]])
+        return int(size)
+    except ValueError:
+        raise ValueError("Not a size: " + str(text))
+
+
+def memory_budget(value=None):
+    ''' Return the budget in bytes, or None for no limit. '''
+    if value is None:
+        value = os.environ.get(BUDGET_ENV, '').strip() or None
+    if value is None:
+        return None
+    return parse_size(value)
+
+
+class MemoryBudget(object):
+    ''' Keeps count of the bytes in use and admits new work while they fit.
+
+    Parameters:
+    limit : int or string The budget (see parse_size); None for no limit.
+    '''
+
+    def __init__(self, limit=None):
+        self.limit = memory_budget(limit)
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.reclaimers = []
+        self.condition = threading.Condition()
+
+    def add_reclaimer(self, reclaim):
+        ''' reclaim(amount) frees up to amount bytes and returns how many it freed. '''
+        self.reclaimers.append(reclaim)
+
+    def _fits(self, amount):
+        # Something that is larger than the whole budget is let in once nothing else is held
+        return self.limit is None or self.used + amount <= self.limit or self.used == 0
+
+    def _take(self, amount):
+        self.used = self.used + amount
+        self.peak = max(self.peak, self.used)
+
+    def _reclaim(self, amount):
+        with self.condition:
+            if self.limit is None:
+                return
+            needed = self.used + amount - self.limit
+        for reclaim in self.reclaimers:
+            if needed <= 0:
+                return
+            needed = needed - reclaim(needed)
+
+    def acquire(self, amount, urgent=None):
+        ''' Wait until amount bytes fit in the budget and take them.
+
+        urgent is an event (see prefetch.wanted) that lets the bytes in over
+        the budget once it is set, because whoever would give memory back is
+        waiting for them.
+        '''
+        while True:
+            with self.condition:
+                if self._fits(amount) or (urgent is not None and urgent.is_set()):
+                    self._take(amount)
+                    return amount
+            self._reclaim(amount)
+            with self.condition:
+                if self._fits(amount):
+                    self._take(amount)
+                    return amount
+                self.waits = self.waits + 1
+                self.condition.wait(0.05 if urgent is not None else 1.0)
+
+    def charge(self, amount):
+        ''' Take amount bytes without waiting, making room in the caches if needed. '''
+        with self.condition:
+            fits = self._fits(amount)
+        if not fits:
+            self._reclaim(amount)
+        with self.condition:
+            self._take(amount)
+        return amount
+
+    def release(self, amount):
+        ''' Give back amount bytes taken with acquire or charge. '''
+        with self.condition:
+            self.used = self.used - amount
+            self.condition.notify_all()
@@ -0,0 +1,153 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Color management of the copies for a printer profile.
+
+Sheets are laid out in sRGB.  With a printer profile (the printer_profile
+parameter or DOUBLESPACE_PRINTER_PROFILE, the path of an RGB ICC profile) every
+copy is converted to the printer's colors before it goes on a sheet; the paper
+around the copies stays white.  DOUBLESPACE_INTENT picks the rendering intent:
+perceptual (the default), relative, saturation or absolute.
+
+The conversion is not done by a color transform per copy.  The transform from
+sRGB to the printer profile is run once on a grid of LUT_SIZE colors per
+channel, and the copies are looked up in that grid by Pillow's Color3DLUT
+filter, which interpolates between its points.  The grid is cached in a file
+named after both profiles, the intent and the grid size, in the folder given
+by DOUBLESPACE_LUT_CACHE (by default .doublespace/luts in the home folder), so
+later runs load it instead of building the transform.  Converted colors are
+within one level of those of the full transform.
+
+This module only reads the settings and the cache; engine.printer_lut builds
+the grid and engine.convert_copy converts the copies.  Inside GIMP,
+gimp_ops.convert_for_printer converts the resized pictures with GIMP's own
+color management.
+'''
+
+import hashlib
+import os
+
+from doublespace.output import replace
+
+PROFILE_ENV = 'DOUBLESPACE_PRINTER_PROFILE'
+INTENT_ENV = 'DOUBLESPACE_INTENT'
+LUT_CACHE_ENV = 'DOUBLESPACE_LUT_CACHE'
+
+# Rendering intents, numbered as in ICC profiles
+INTENTS = {'perceptual': 0, 'relative': 1, 'saturation': 2, 'absolute': 3}
+
+DEFAULT_INTENT = 'perceptual'
+
+# Grid points per channel; 33 is the usual size of printer profile tables
+LUT_SIZE = 33
+
+
+def printer_profile(value=None):
+    ''' Return the path of the printer profile, or None to keep sRGB.
+
+    None reads DOUBLESPACE_PRINTER_PROFILE; '' and 'none' mean no profile.
+    '''
+    if value is None:
+        value = os.environ.get(PROFILE_ENV, '')
+    value = str(value).strip()
+    if value.lower() in ('', 'none'):
+        return None
+    return value
+
+
+def rendering_intent(value=None):
+    ''' Return the name of the rendering intent (see INTENTS).
+
+    None reads DOUBLESPACE_INTENT.  Raises ValueError for unknown names.
+    '''
+    if value is None:
+        value = os.environ.get(INTENT_ENV, '')
+    name = str(value).strip().lower() or DEFAULT_INTENT
+    if name not in INTENTS:
+        raise ValueError("Unknown rendering intent: " + name)
+    return name
+
+
+def lut_folder(value=None):
+    ''' Return the folder the LUTs are cached in; None reads DOUBLESPACE_LUT_CACHE. '''
+    if value is None:
+        value = os.environ.get(LUT_CACHE_ENV, '').strip()
+    return value or os.path.join(os.path.expanduser('~'), '.doublespace', 'luts')
+
+
+def lut_name(source, printer, intent, size=LUT_SIZE):
+    ''' Return the cache file name of the LUT from the source to the printer
+    profile for intent and size.  source and printer are the bytes of the
+    profile files, or a name for a built in profile such as b'sRGB'.
+    '''
+    digest = hashlib.sha1()
+    for part in (source, printer, intent.encode('ascii'), str(size).encode('ascii')):
+        # The length keeps the parts apart
+        digest.update(str(len(part)).encode('ascii') + b':' + part)
+    return digest.hexdigest() + '.lut'
+
+
+def grid_colors(size=LUT_SIZE):
+    ''' Return the colors of the grid points in the order of a Color3DLUT table:
+    red changes fastest, blue slowest.
+    '''
+    levels = [int(round(i * 255.0 / (size - 1))) for i in range(size)]
+    return [(red, green, blue) for blue in levels for green in levels for red in levels]
+
+
+def read_lut(path, size=LUT_SIZE):
+    ''' Return the converted grid colors cached at path, as bytes with three per
+    point, or None if there is no complete cache file.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    if len(data) != size * size * size * 3:
+        return None
+    return data
+
+
+def write_lut(path, data):
+    ''' Cache the converted grid colors data at path.  The cache is only a
+    shortcut, so a folder that can not be written is not an error.
+    '''
+    temp_path = path + '.' + str(os.getpid()) + '.part'
+    try:
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        replace(temp_path, path)
+    except (IOError, OSError):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,126 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' JPEG quality for a maximum sheet size.
+
+Sheets are saved at quality 90.  With a maximum size per sheet (the max_bytes
+parameter or DOUBLESPACE_MAX_SHEET_SIZE, e.g. 2M) a sheet that comes out
+larger is saved again at the highest quality that fits, down to MIN_QUALITY.
+
+Finding that quality by encoding the whole sheet again and again would cost a
+full encode per try, so the search encodes a sample instead: one band of 16
+rows (one row of JPEG blocks) out of every SAMPLE_STEP, about a quarter of the
+sheet.  Its size times the ratio of the full and sample sizes at quality 90
+predicts the full size to a few percent; the sheet is then encoded at the
+predicted quality and, if it still does not fit, at a few lower ones.
+
+A sheet that is still too large at MIN_QUALITY is saved anyway, as a smaller
+sheet than that would not be worth printing; oversize_warning gives the
+message the callers report it with.
+'''
+
+import os
+
+from doublespace.budget import parse_size
+
+MAX_SIZE_ENV = 'DOUBLESPACE_MAX_SHEET_SIZE'
+
+MIN_QUALITY = 40
+
+# Quality steps tried on the full sheet when the prediction was too high
+QUALITY_STEP = 3
+
+SAMPLE_STEP = 4
+SAMPLE_BAND = 16
+
+
+def max_sheet_bytes(value=None):
+    ''' Return the maximum sheet size in bytes, or None for no maximum. '''
+    if value is None:
+        value = os.environ.get(MAX_SIZE_ENV, '').strip()
+    if not str(value).strip() or str(value).strip() == '0':
+        return None
+    return parse_size(value)
+
+
+def sample_bands(height):
+    ''' Return the (top, bottom) rows of the bands of a sheet height rows high
+    that go into the sample.
+    '''
+    return [(top, min(height, top + SAMPLE_BAND))
+            for top in range(0, height, SAMPLE_BAND * SAMPLE_STEP)]
+
+
+def search_quality(size_at, max_bytes, low=MIN_QUALITY, high=90):
+    ''' Return the highest quality from low to high for which size_at(quality)
+    is at most max_bytes, or low if none is.  size_at must grow with quality.
+    '''
+    while low < high:
+        middle = (low + high + 1) // 2
+        if size_at(middle) <= max_bytes:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def oversize_warning(name, size, quality, max_bytes):
+    ''' Return a warning for a sheet of size bytes saved at quality that is
+    larger than max_bytes, or None if it fits.
+    '''
+    if max_bytes is None or size <= max_bytes:
+        return None
+    return ("Warning: %s is %d KB at quality %d, larger than the maximum sheet size of %d KB"
+            % (name, (size + 1023) // 1024, quality, (max_bytes + 1023) // 1024))
+
+
+def fit_quality(encode, sample_size, max_bytes, quality):
+    ''' Encode a sheet at the highest quality up to quality whose size is at
+    most max_bytes.
+
+    Parameters:
+    encode : function encode(quality) returns the encoded sheet.
+    sample_size : function sample_size(quality) returns the encoded size of the sample.
+    max_bytes : int The maximum size; None for no maximum.
+    quality : int The quality to start from.
+
+    Returns a tuple (encoded sheet, quality).  The sheet is larger than
+    max_bytes if even MIN_QUALITY does not fit.
+    '''
+    data = encode(quality)
+    if max_bytes is None or len(data) <= max_bytes:
+        return data, quality
+    scale = len(data) * 1.0 / sample_size(quality)
+    chosen = search_quality(lambda q: sample_size(q) * scale, max_bytes, MIN_QUALITY, quality - 1)
+    while True:
+        data = encode(chosen)
+        if len(data) <= max_bytes or chosen <= MIN_QUALITY:
+            return data, chosen
+        chosen = max(MIN_QUALITY, chosen - QUALITY_STEP)
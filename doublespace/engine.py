@@ -0,0 +1,331 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Headless layout engine.
+
+Does the same work as the GIMP plugins (check, rotate, resize, tile, save) with
+Pillow, so layouts can be rendered outside of GIMP.
+'''
+
+import io
+import math
+import os
+
+from PIL import Image, ImageCms, ImageFilter, ImageOps, ImageStat
+
+from doublespace import sizes
+from doublespace import color
+from doublespace import enhance
+from doublespace import quality
+from doublespace.compression import fit_quality, sample_bands
+from doublespace.plan import check_source_size, scaled_plan
+from doublespace.preview import DEFAULT_DPI, preview_factor
+from doublespace.resample import resample_mode, resample_steps
+
+# White, the background of every sheet
+WHITE = (255, 255, 255)
+
+JPEG_QUALITY = 90
+
+FILTERS = {
+    'nearest': Image.NEAREST,
+    'box': Image.BOX,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+}
+
+
+class LayoutError(Exception):
+    ''' A picture can not be laid out, for example because of its aspect ratio. '''
+
+
+class QualityError(Exception):
+    ''' A picture failed the quality check (see quality.py). '''
+
+
+# Laplacian, offset so that negative responses are kept
+LAPLACIAN = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+
+
+# Function to open a picture file as an RGB image
+def load_picture(path):
+    image = Image.open(path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    else:
+        image.load()
+    return image
+
+
+# Function to estimate the memory of an image of width x height once decoded.
+# Pillow keeps RGB images with 4 bytes per pixel.
+def image_bytes(width, height):
+    return width * height * 4
+
+
+# Function to read the (width, height) of a picture file from its header only
+def picture_dimensions(path):
+    image = Image.open(path)
+    try:
+        return image.size
+    finally:
+        # Closing the image would close a file given instead of a path
+        if not hasattr(path, 'read'):
+            image.close()
+
+
+# Function to estimate the memory of a picture file once decoded, from its header only
+def picture_footprint(path):
+    return image_bytes(*picture_dimensions(path))
+
+
+# Function to resize a picture with a resampling mode or preset (see resample.py)
+def resize(image, size, resampling=None):
+    mode, reducing_gap = resample_mode(resampling)
+    for step in resample_steps(image.size, size, mode, reducing_gap):
+        if step[0] == 'reduce':
+            factor = step[1]
+            if hasattr(image, 'reduce'):
+                image = image.reduce(factor)
+            else:
+                image = image.resize((image.size[0] // factor, image.size[1] // factor), Image.BOX)
+        else:
+            image = image.resize(step[1], FILTERS[step[2]])
+    return image
+
+
+# Function to check, rotate and resize a picture to the copy size of the plan
+# source_size is the size of the picture file if image was decoded smaller (e.g. for a preview).
+def prepare_copy(image, plan, resampling=None, source_size=None):
+    source_width, source_height = source_size or image.size
+    error = check_source_size(source_width, source_height, plan.picture_size)
+    if error:
+        raise LayoutError(error)
+
+    img_width, img_height = image.size
+    if plan.rotate_portrait and img_height > img_width:
+        # Same as gimp_image_rotate(image, 0): 90 degrees clockwise
+        image = image.transpose(Image.ROTATE_270)
+        img_width, img_height = image.size
+
+    new_width = plan.copy_width
+    new_height = plan.copy_height
+    if plan.keep_aspect:
+        new_height = int(plan.copy_width * img_height * 1.0 / img_width)
+
+    return resize(image, (new_width, new_height), resampling)
+
+
+# Function to resize a copy for a sheet at factor times its resolution, e.g. for a thumbnail
+def scale_copy(copy, factor, resampling=None):
+    width, height = copy.size
+    return resize(copy, (max(1, int(round(width * factor))), max(1, int(round(height * factor)))),
+                  resampling)
+
+
+def enhance_copy(copy, steps=None):
+    ''' Run the enhancement steps (see enhance.py) on a resized copy. '''
+    for step in enhance.enhance_steps(steps):
+        if step == 'balance':
+            # Every channel is stretched on its own
+            copy = ImageOps.autocontrast(copy, cutoff=enhance.CLIP_PERCENT)
+        elif step == 'levels':
+            copy = _stretch_levels(copy)
+        elif step == 'sharpen':
+            copy = copy.filter(ImageFilter.UnsharpMask(enhance.SHARPEN_RADIUS, enhance.SHARPEN_AMOUNT,
+                                                       enhance.SHARPEN_THRESHOLD))
+    return copy
+
+
+# LUTs this process has built or loaded, by cache file
+_luts = {}
+
+
+def printer_lut(profile=None, intent=None, cache=None):
+    ''' Return the Color3DLUT filter from sRGB to the printer profile for
+    intent (see color.py), or None without a printer profile.  The LUT is
+    loaded from the cache folder, or built and cached there.
+
+    Raises IOError if the profile can not be read and ValueError if it is not
+    an RGB ICC profile.
+    '''
+    profile = color.printer_profile(profile)
+    if profile is None:
+        return None
+    intent = color.rendering_intent(intent)
+    with open(profile, 'rb') as f:
+        printer = f.read()
+    path = os.path.join(color.lut_folder(cache), color.lut_name(b'sRGB', printer, intent))
+    if path not in _luts:
+        data = color.read_lut(path)
+        if data is None:
+            try:
+                opened = ImageCms.ImageCmsProfile(io.BytesIO(printer))
+            except (IOError, OSError):
+                raise ValueError("Not an ICC profile: " + profile)
+            data = _convert_grid(opened, intent)
+            color.write_lut(path, data)
+        _luts[path] = ImageFilter.Color3DLUT(color.LUT_SIZE, [value / 255.0 for value in data])
+    return _luts[path]
+
+
+# Function to run the transform from sRGB to printer on the grid of color.py,
+# returning the converted colors as bytes
+def _convert_grid(printer, intent):
+    if printer.profile.xcolor_space.strip() != 'RGB':
+        raise ValueError("Printer profile is not an RGB profile: " + printer.profile.xcolor_space.strip())
+    try:
+        transform = ImageCms.buildTransform(ImageCms.createProfile('sRGB'), printer, 'RGB', 'RGB',
+                                            color.INTENTS[intent])
+    except ImageCms.PyCMSError as err:
+        raise ValueError("Printer profile can not be used: " + str(err))
+    grid = Image.new('RGB', (color.LUT_SIZE, color.LUT_SIZE * color.LUT_SIZE))
+    grid.putdata(color.grid_colors())
+    return ImageCms.applyTransform(grid, transform).tobytes()
+
+
+def convert_copy(copy, lut):
+    ''' Convert a copy to the printer's colors with lut (see printer_lut). '''
+    if lut is None:
+        return copy
+    return copy.filter(lut)
+
+
+# Function to stretch all channels of image by the same amount, from the range of its luminance
+def _stretch_levels(image):
+    histogram = image.convert('L').histogram()
+    clip = sum(histogram) * enhance.CLIP_PERCENT / 100.0
+    low = _clipped_end(histogram, clip)
+    high = 255 - _clipped_end(histogram[::-1], clip)
+    if high <= low:
+        return image
+    table = [min(255, max(0, int(round((value - low) * 255.0 / (high - low))))) for value in range(256)]
+    return image.point(table * len(image.getbands()))
+
+
+# Function to find the first level of histogram after clip pixels
+def _clipped_end(histogram, clip):
+    count = 0
+    for level, pixels in enumerate(histogram):
+        count = count + pixels
+        if count > clip:
+            return level
+    return 0
+
+
+# Function to score the sharpness and exposure of a picture file on a small gray decode
+def score_picture(path):
+    image = Image.open(path)
+    image.draft('L', (quality.SCORE_SIZE, quality.SCORE_SIZE))
+    image = image.convert('L')
+    image.thumbnail((quality.SCORE_SIZE, quality.SCORE_SIZE))
+    histogram = image.histogram()
+    total = float(sum(histogram))
+    return quality.Score(ImageStat.Stat(image.filter(LAPLACIAN)).var[0],
+                         sum(histogram[:quality.CLIP_LEVELS]) * 100.0 / total,
+                         sum(histogram[-quality.CLIP_LEVELS:]) * 100.0 / total)
+
+
+# Function to make a new white sheet
+def new_canvass(width, height):
+    return Image.new('RGB', (width, height), WHITE)
+
+
+# Function to make the given areas of a used sheet white again
+def clear_canvass(canvass, boxes=None):
+    if boxes is None:
+        boxes = [(0, 0) + canvass.size]
+    for box in boxes:
+        canvass.paste(WHITE, box)
+
+
+# Function to list the areas of the sheet the copies are put on
+def copy_boxes(copy, plan):
+    copy_width, copy_height = copy.size
+    return [(x, y, x + copy_width, y + copy_height) for x, y in plan.positions]
+
+
+# Function to put a copy on every position of the plan.
+# The copies go on canvass if one is given (e.g. from a CanvassPool), otherwise on a new sheet.
+def compose_sheet(copy, plan, canvass=None):
+    if canvass is None:
+        canvass = new_canvass(plan.canvass_width, plan.canvass_height)
+    for position in plan.positions:
+        canvass.paste(copy, position)
+    return canvass
+
+
+# Function to encode a sheet the way the plugins save it, with its resolution (default sizes.BASE_DPI)
+def encode_sheet(canvass, quality=JPEG_QUALITY, dpi=None):
+    dpi = dpi or sizes.BASE_DPI
+    data = io.BytesIO()
+    canvass.save(data, 'JPEG', quality=quality, dpi=(dpi, dpi))
+    return data.getvalue()
+
+
+def encode_to_size(canvass, max_bytes, quality=JPEG_QUALITY, dpi=None):
+    ''' Encode canvass like encode_sheet, at a lower quality if it would be
+    larger than max_bytes (see compression.py).  Returns (data, quality).
+    '''
+    sample = []
+
+    def sample_size(sample_quality):
+        if not sample:
+            width, height = canvass.size
+            bands = sample_bands(height)
+            image = Image.new(canvass.mode, (width, sum(bottom - top for top, bottom in bands)))
+            y = 0
+            for top, bottom in bands:
+                image.paste(canvass.crop((0, top, width, bottom)), (0, y))
+                y = y + bottom - top
+            sample.append(image)
+        return len(encode_sheet(sample[0], sample_quality, dpi))
+
+    return fit_quality(lambda q: encode_sheet(canvass, q, dpi), sample_size, max_bytes, quality)
+
+
+def render_preview(path, plan, dpi=DEFAULT_DPI):
+    ''' Render the sheet of plan for the picture at path at dpi and return it
+    encoded.  JPEG pictures are decoded at a fraction of their size, so this
+    takes a fraction of the time of the full sheet.
+    '''
+    small = scaled_plan(plan, preview_factor(dpi, plan.dpi))
+    image = Image.open(path)
+    source_size = image.size
+    width, height = source_size
+    if plan.rotate_portrait and height > width:
+        width, height = height, width
+    scale = max(small.copy_width * 1.0 / width, small.copy_height * 1.0 / height)
+    image.draft('RGB', (int(math.ceil(source_size[0] * scale)), int(math.ceil(source_size[1] * scale))))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    copy = prepare_copy(image, small, 'bilinear', source_size)
+    return encode_sheet(compose_sheet(copy, small), dpi=dpi)
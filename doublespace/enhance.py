@@ -0,0 +1,80 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Optional print enhancement of the resized copies.
+
+Steps, applied in this order:
+
+    balance  white balance: stretch each color channel to the full range
+    levels   auto levels: stretch all channels together, keeping the tones
+    sharpen  unsharp mask against the softness of downscaling
+
+They run on the resized copy, not the source, so their statistics come from
+a few hundred thousand pixels at most and a copy takes a few milliseconds.
+DOUBLESPACE_ENHANCE selects them as a comma separated list, or 'all'; by
+default nothing is changed.
+
+This module only picks the steps; engine.enhance_copy and
+gimp_ops.enhance_picture carry them out.
+'''
+
+import os
+
+ENHANCE_ENV = 'DOUBLESPACE_ENHANCE'
+
+STEPS = ['balance', 'levels', 'sharpen']
+
+# Percentage of the darkest and of the brightest pixels clipped by balance and levels
+CLIP_PERCENT = 0.5
+
+# Unsharp mask: radius in pixels of the copy, amount in percent, threshold in levels
+SHARPEN_RADIUS = 1.0
+SHARPEN_AMOUNT = 60
+SHARPEN_THRESHOLD = 2
+
+
+def enhance_steps(value=None):
+    ''' Return the steps to run, in order, for a list or comma separated names.
+
+    None reads DOUBLESPACE_ENHANCE.  Raises ValueError for unknown names.
+    '''
+    if value is None:
+        value = os.environ.get(ENHANCE_ENV, '')
+    if not isinstance(value, (list, tuple)):
+        value = str(value).split(',')
+    names = set(str(name).strip().lower() for name in value)
+    names.discard('')
+    names.discard('none')
+    if 'all' in names:
+        return list(STEPS)
+    unknown = names.difference(STEPS)
+    if unknown:
+        raise ValueError("Unknown enhancement: " + ', '.join(sorted(unknown)))
+    return [step for step in STEPS if step in names]
@@ -0,0 +1,368 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Dry runs: how many sheets a run makes, how much paper, memory and time it takes.
+
+Only the picture headers are read.  The layout plans give the sheets and paper;
+the time comes from a cost model of seconds per megapixel for every stage (and
+bytes per megapixel of an encoded sheet).  The built in costs were measured with
+benchmarks/bench_stages.py on one core of a Xeon server with the default
+resampling; another machine (or mode) is calibrated by running the benchmark
+there with --json and passing the file with --calibration or
+DOUBLESPACE_CALIBRATION.
+
+The estimates assume every readable picture of the right size is laid out:
+the quality check (see quality.py) needs the pixels and is not predicted.
+'''
+
+import os
+import json
+import multiprocessing
+
+from doublespace import budget
+from doublespace import engine
+from doublespace import sizes
+from doublespace.batch import CACHE_SIZE, PICTURE_EXTENSIONS
+from doublespace.compression import max_sheet_bytes
+from doublespace.inputs import ARCHIVE_ERRORS, open_pictures
+from doublespace.outputs import output_dpis
+from doublespace.plan import check_source_size, layout_plan
+from doublespace.prefetch import prefetch_depth
+from doublespace.resample import resample_mode, resample_steps
+from doublespace.shared import encoder_count
+
+CALIBRATION_ENV = 'DOUBLESPACE_CALIBRATION'
+
+# Seconds per megapixel: decode of the source, box reduction and filtered resize
+# of their input, compose of the copies and encode of the sheet; sheet_bytes is
+# bytes per megapixel of sheet
+DEFAULT_COSTS = {'decode': 0.0060, 'reduce': 0.0011, 'resize': 0.0120, 'compose': 0.0008,
+                 'encode': 0.0045, 'sheet_bytes': 167000}
+
+STAGES = ('decode', 'resize', 'compose', 'encode')
+
+# Encodes of a sheet that is saved at a lower quality, see compression.py
+FITTED_ENCODES = 3
+
+# Memory of the interpreter with Pillow loaded, before any picture
+BASE_BYTES = 24 << 20
+
+
+def cost_model(path=None):
+    ''' Return the costs, from the JSON file written by bench_stages.py at path
+    (or DOUBLESPACE_CALIBRATION) where it has them, the built in ones otherwise.
+    '''
+    path = path or os.environ.get(CALIBRATION_ENV, '').strip()
+    costs = dict(DEFAULT_COSTS)
+    if path:
+        with open(path) as f:
+            measured = json.load(f)
+        costs.update((name, float(measured[name])) for name in DEFAULT_COSTS if name in measured)
+    return costs
+
+
+def _megapixels(width, height):
+    return width * height / 1e6
+
+
+# Function to compute (turned source size, copy size) of a width x height source,
+# as engine.prepare_copy makes the copy
+def _copy_size(width, height, plan):
+    if plan.rotate_portrait and height > width:
+        width, height = height, width
+    if plan.keep_aspect:
+        return (width, height), (plan.copy_width, int(plan.copy_width * height * 1.0 / width))
+    return (width, height), (plan.copy_width, plan.copy_height)
+
+
+# Function to estimate the memory of the first pass of a filtered resize of size to target
+def _resize_bytes(size, target):
+    return engine.image_bytes(target[0], size[1])
+
+
+def _scaled(size, factor):
+    return max(1, int(round(size[0] * factor))), max(1, int(round(size[1] * factor)))
+
+
+def _largest(values, count):
+    return sum(sorted(values, reverse=True)[:count])
+
+
+def _duration(seconds):
+    if seconds < 60:
+        return "%.1f s" % seconds
+    if seconds < 3600:
+        return "%d min %02d s" % (seconds // 60, seconds % 60)
+    return "%d h %02d min" % (seconds // 3600, seconds % 3600 // 60)
+
+
+def _megabytes(size):
+    return "%.1f MB" % (size / float(1 << 20))
+
+
+class RunEstimate(object):
+    ''' The expected outcome and cost of a run.
+
+    Parameters:
+    calibration : string Costs file, see cost_model.
+    '''
+
+    def __init__(self, calibration=None):
+        self.costs = cost_model(calibration)
+        self.pictures = 0
+        self.failed = []
+        self.sheets = 0
+        self.rendered = 0
+        self.papers = {}
+        self.paper_pixels = 0
+        self.copy_pixels = 0
+        self.output_bytes = 0
+        self.peak_bytes = 0
+        self.stage_seconds = dict((stage, 0.0) for stage in STAGES)
+        self.seconds = 0.0
+
+    def probe(self, path, pictures=None):
+        ''' Return the (width, height) of the picture at path, or None if it
+        can not be read.  pictures is the folder or archive to open it from
+        (see inputs.open_pictures), if any.
+        '''
+        try:
+            if pictures is None:
+                return engine.picture_dimensions(path)
+            with pictures.open(path) as picture:
+                return engine.picture_dimensions(picture)
+        except (IOError, OSError) + ARCHIVE_ERRORS as err:
+            self.failed.append((path, str(err)))
+            return None
+
+    def check(self, path, width, height, plan):
+        ''' Return whether the picture at path fits plan, see check_source_size. '''
+        error = check_source_size(width, height, plan.picture_size)
+        if error:
+            self.failed.append((path, error))
+        return not error
+
+    def add(self, stage, width, height, times=1, cost=None):
+        ''' Add the cost of stage for times width x height pixels. '''
+        self.stage_seconds[stage] += self.costs[cost or stage] * _megapixels(width, height) * times
+
+    def add_resize(self, size, target, resampling=None):
+        ''' Add the resize of size to target, step by step as engine.resize does it. '''
+        mode, reducing_gap = resample_mode(resampling)
+        width, height = size
+        for step in resample_steps(size, target, mode, reducing_gap):
+            if step[0] == 'reduce':
+                self.add('resize', width, height, cost='reduce')
+                width, height = width // step[1], height // step[1]
+            else:
+                self.add('resize', width, height)
+
+    def add_sheet(self, width, height, dpi, outputs, max_bytes, copies=1):
+        ''' Add the encode of a width x height sheet at dpi, the sheets at the
+        outputs resolutions and the bytes of copies saved sheets.
+        '''
+        size = self.costs['sheet_bytes'] * _megapixels(width, height)
+        if max_bytes is not None and size > max_bytes:
+            self.add('encode', width, height, FITTED_ENCODES)
+            size = max_bytes
+        else:
+            self.add('encode', width, height)
+        self.output_bytes += size * copies
+        for output_dpi in outputs:
+            factor = output_dpi * 1.0 / dpi
+            self.add('encode', width * factor, height * factor)
+            self.output_bytes += self.costs['sheet_bytes'] * _megapixels(width, height) * factor * factor
+
+    def finish(self, read_ahead, encoders=0, cpus=None):
+        ''' Work out the wall time: pictures read ahead are decoded on other
+        threads and encoder processes encode while the next sheet is composed,
+        as far as there are cores for them.
+        '''
+        cpus = cpus or multiprocessing.cpu_count()
+        decode = self.stage_seconds['decode']
+        encode = self.stage_seconds['encode']
+        work = self.stage_seconds['resize'] + self.stage_seconds['compose']
+        if encoders and cpus > 1:
+            work = max(work, encode / min(encoders, cpus - 1))
+        else:
+            work = work + encode
+        if read_ahead and cpus > 1:
+            self.seconds = max(decode, work)
+        else:
+            self.seconds = decode + work
+
+    def report(self):
+        ''' Return the estimate as a list of lines. '''
+        lines = ["%d pictures, %d would fail" % (self.pictures, len(self.failed))]
+        lines.extend(path + ": " + reason for path, reason in self.failed)
+        papers = ', '.join("%d %s" % (self.papers[paper], paper) for paper in sorted(self.papers))
+        lines.append("Sheets: %d (%d rendered)%s" % (self.sheets, self.rendered,
+                                                      ': ' + papers if papers else ''))
+        if self.paper_pixels:
+            lines.append("Paper use: %d%% covered by copies" % (100.0 * self.copy_pixels / self.paper_pixels))
+        lines.append("Output: about " + _megabytes(self.output_bytes))
+        lines.append("Peak memory: about " + _megabytes(self.peak_bytes))
+        lines.append("Time: about %s (%s)" % (_duration(self.seconds), ', '.join(
+            "%s %s" % (stage, _duration(self.stage_seconds[stage])) for stage in STAGES)))
+        return lines
+
+
+def estimate_orders(orders, resampling=None, dpi=None, workers=1, memory_budget=None, encoders=None,
+                    outputs=None, max_bytes=None, calibration=None):
+    ''' Estimate run_orders for orders (see batch.run_orders for the parameters)
+    and return a RunEstimate.
+    '''
+    estimate = RunEstimate(calibration)
+    encoders = encoder_count(encoders)
+    outputs = output_dpis(outputs, sizes.sheet_dpi(dpi))
+    max_bytes = max_sheet_bytes(max_bytes)
+    plans = {}
+    probed = {}
+    copies = {}
+    passes = [0]
+    rendered = set()
+    sheet_sizes = set()
+
+    for order in orders:
+        key = (order.picture_size, order.paper_size)
+        if key not in plans:
+            plans[key] = layout_plan(order.picture_size, order.paper_size, dpi)
+        plan = plans[key]
+        if order.source not in probed:
+            probed[order.source] = estimate.probe(order.source)
+            if probed[order.source] is not None:
+                estimate.pictures += 1
+                estimate.add('decode', *probed[order.source])
+        if probed[order.source] is None:
+            continue
+        width, height = probed[order.source]
+        if not estimate.check(order.source, width, height, plan):
+            continue
+
+        turned, copy = _copy_size(width, height, plan)
+        if (order.source, plan.picture_size) not in copies:
+            estimate.add_resize(turned, copy, resampling)
+            copies[(order.source, plan.picture_size)] = engine.image_bytes(*copy)
+            passes.append(_resize_bytes(turned, copy))
+        sheet = (order.source, plan.picture_size, plan.paper_size)
+        if sheet not in rendered:
+            rendered.add(sheet)
+            estimate.rendered += 1
+            estimate.add('compose', copy[0], copy[1], len(plan.positions))
+            for output_dpi in outputs:
+                factor = output_dpi * 1.0 / plan.dpi
+                estimate.add_resize(copy, _scaled(copy, factor), resampling)
+                estimate.add('compose', copy[0] * factor, copy[1] * factor, len(plan.positions))
+            estimate.add_sheet(plan.canvass_width, plan.canvass_height, plan.dpi, outputs,
+                               max_bytes, order.copies)
+        else:
+            estimate.output_bytes += (estimate.costs['sheet_bytes'] * order.copies *
+                                      _megapixels(plan.canvass_width, plan.canvass_height))
+        sheet_sizes.add((plan.canvass_width, plan.canvass_height))
+        estimate.sheets += order.copies
+        estimate.papers[plan.paper_size] = estimate.papers.get(plan.paper_size, 0) + order.copies
+        estimate.paper_pixels += plan.canvass_width * plan.canvass_height * order.copies
+        estimate.copy_pixels += copy[0] * copy[1] * len(plan.positions) * order.copies
+
+    # The renderer keeps CACHE_SIZE pictures and sheets and four times as many
+    # copies, besides the pictures being read ahead; a canvass per size and
+    # encoder process
+    canvasses = sum(engine.image_bytes(*size) for size in sheet_sizes) * (encoders + 1)
+    pictures = [engine.image_bytes(*size) for size in probed.values() if size is not None]
+    cached = (_largest(pictures, CACHE_SIZE + workers + 1) + _largest(copies.values(), CACHE_SIZE * 4) +
+              CACHE_SIZE * estimate.costs['sheet_bytes'] *
+              max([_megapixels(*size) for size in sheet_sizes] or [0]))
+    limit = budget.memory_budget(memory_budget)
+    if limit is not None:
+        cached = min(cached, max(limit - canvasses, max(pictures or [0])))
+    estimate.peak_bytes = BASE_BYTES + canvasses + cached + max(passes)
+    estimate.finish(workers, encoders)
+    return estimate
+
+
+def estimate_folder(inputFolder, paper_size='4R', picture_size='2R', resampling=None, dpi=None,
+                    prefetch=None, memory_budget=None, outputs=None, max_bytes=None, calibration=None):
+    ''' Estimate run_folder for the pictures of inputFolder (see
+    batch.run_folder for the parameters) and return a RunEstimate.
+    '''
+    estimate = RunEstimate(calibration)
+    plan = layout_plan(picture_size, paper_size, dpi)
+    outputs = output_dpis(outputs, plan.dpi)
+    max_bytes = max_sheet_bytes(max_bytes)
+    depth = prefetch_depth(prefetch)
+    placed = 0
+    pictures = []
+    copies = []
+    passes = [0]
+
+    folder = open_pictures(inputFolder)
+    paths = folder.names(PICTURE_EXTENSIONS)
+    for path in paths:
+        size = estimate.probe(path, folder)
+        if size is None:
+            continue
+        estimate.pictures += 1
+        estimate.add('decode', *size)
+        if not estimate.check(path, size[0], size[1], plan):
+            continue
+        turned, copy = _copy_size(size[0], size[1], plan)
+        estimate.add_resize(turned, copy, resampling)
+        passes.append(_resize_bytes(turned, copy))
+        estimate.add('compose', *copy)
+        for output_dpi in outputs:
+            factor = output_dpi * 1.0 / plan.dpi
+            estimate.add_resize(copy, _scaled(copy, factor), resampling)
+            estimate.add('compose', copy[0] * factor, copy[1] * factor)
+        estimate.copy_pixels += copy[0] * copy[1]
+        pictures.append(engine.image_bytes(*size))
+        copies.append(engine.image_bytes(*copy))
+        placed += 1
+    folder.close()
+
+    # The last sheet is saved even if it is not full
+    estimate.sheets = estimate.rendered = (placed + len(plan.positions) - 1) // len(plan.positions)
+    if estimate.sheets:
+        estimate.papers[plan.paper_size] = estimate.sheets
+    estimate.paper_pixels = plan.canvass_width * plan.canvass_height * estimate.sheets
+    for _ in range(estimate.sheets):
+        estimate.add_sheet(plan.canvass_width, plan.canvass_height, plan.dpi, outputs, max_bytes)
+
+    # One sheet (and its smaller ones), the current picture, those read ahead
+    # and the one being read
+    canvasses = sum(engine.image_bytes(int(plan.canvass_width * output_dpi * 1.0 / plan.dpi),
+                                       int(plan.canvass_height * output_dpi * 1.0 / plan.dpi))
+                    for output_dpi in [plan.dpi] + outputs)
+    decoded = _largest(pictures, depth + 2 if depth else 1)
+    limit = budget.memory_budget(memory_budget)
+    if limit is not None:
+        decoded = min(decoded, max(limit - canvasses, max(pictures or [0])))
+    estimate.peak_bytes = BASE_BYTES + canvasses + decoded + max(copies or [0]) + max(passes)
+    estimate.finish(depth)
+    return estimate
@@ -0,0 +1,435 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' GIMP operations shared by the plugins.
+
+Only usable inside GIMP.
+'''
+
+import os
+from contextlib import contextmanager
+
+try:
+    from urllib import pathname2url
+    from urlparse import urljoin
+except ImportError:
+    from urllib.parse import urljoin
+    from urllib.request import pathname2url
+
+from gimpfu import gimp, pdb, CLIP_TO_IMAGE, HISTOGRAM_VALUE, WHITE_FILL
+
+from doublespace import color
+from doublespace import enhance
+from doublespace import metrics
+from doublespace import quality
+from doublespace import sizes
+from doublespace.compression import MIN_QUALITY, max_sheet_bytes, oversize_warning, search_quality
+from doublespace.outputs import output_dpis, output_path
+from doublespace.plan import scale_positions, tile_rows
+from doublespace.preview import preview_dpi, preview_factor
+from doublespace.resample import RESAMPLE_ENV, resample_mode, resample_steps
+
+# GIMP has no box filter; its linear interpolation averages when shrinking
+INTERPOLATIONS = {
+    'nearest': 0,   # INTERPOLATION_NONE
+    'box': 1,       # INTERPOLATION_LINEAR
+    'bilinear': 1,  # INTERPOLATION_LINEAR
+    'bicubic': 2,   # INTERPOLATION_CUBIC
+    'lanczos': 3,   # INTERPOLATION_LANCZOS
+}
+
+
+def scale_picture(image, new_width, new_height, resampling=None):
+    ''' Scale image to new_width x new_height.
+
+    Without a resampling mode (parameter or DOUBLESPACE_RESAMPLE) GIMP's own
+    interpolation setting is used, as before.  Otherwise the steps planned by
+    resample.resample_steps are done with the matching GIMP interpolation.
+    '''
+    new_width = int(new_width)
+    new_height = int(new_height)
+    if resampling is None and not os.environ.get(RESAMPLE_ENV):
+        pdb.gimp_image_scale(image, new_width, new_height)
+        return image
+
+    mode, reducing_gap = resample_mode(resampling)
+    size = (pdb.gimp_image_width(image), pdb.gimp_image_height(image))
+    pdb.gimp_context_push()
+    try:
+        for step in resample_steps(size, (new_width, new_height), mode, reducing_gap):
+            if step[0] == 'reduce':
+                pdb.gimp_context_set_interpolation(INTERPOLATIONS['box'])
+                size = (size[0] // step[1], size[1] // step[1])
+            else:
+                pdb.gimp_context_set_interpolation(INTERPOLATIONS[step[2]])
+                size = step[1]
+            pdb.gimp_image_scale(image, size[0], size[1])
+    finally:
+        pdb.gimp_context_pop()
+    return image
+
+
+def enhance_picture(image, steps=None):
+    ''' Run the enhancement steps (see enhance.py, default DOUBLESPACE_ENHANCE)
+    on the resized picture in image, with GIMP's own filters.
+    '''
+    steps = enhance.enhance_steps(steps)
+    if not steps:
+        return image
+    drawable = image.layers[0]
+    with metrics.stage('enhance'):
+        for step in steps:
+            if step == 'balance':
+                # Colors > Auto > White Balance
+                pdb.gimp_levels_stretch(drawable)
+            elif step == 'levels':
+                low, high = value_range(drawable, enhance.CLIP_PERCENT)
+                if high > low:
+                    pdb.gimp_levels(drawable, HISTOGRAM_VALUE, low, high, 1.0, 0, 255)
+            elif step == 'sharpen':
+                pdb.plug_in_unsharp_mask(image, drawable, enhance.SHARPEN_RADIUS,
+                                         enhance.SHARPEN_AMOUNT / 100.0, enhance.SHARPEN_THRESHOLD)
+    return image
+
+
+# Function to find the value levels below and above which clip_percent of the pixels lie
+def value_range(drawable, clip_percent):
+    def below(level):
+        # Percentage of the pixels with a value of level or less
+        return pdb.gimp_histogram(drawable, HISTOGRAM_VALUE, 0, level)[5] * 100.0
+
+    def first_level(inside):
+        low, high = 0, 255
+        while low < high:
+            middle = (low + high) // 2
+            if inside(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    low = first_level(lambda level: below(level) > clip_percent)
+    high = first_level(lambda level: below(level) >= 100.0 - clip_percent)
+    return low, high
+
+
+@contextmanager
+def frozen(image):
+    ''' Keep the Layers dialog of image still while many layers are added
+    (GIMP 2.10; older versions have nothing to freeze).
+    '''
+    freeze = getattr(pdb, 'gimp_image_freeze_layers', None)
+    if freeze is None:
+        yield image
+        return
+    freeze(image)
+    try:
+        yield image
+    finally:
+        pdb.gimp_image_thaw_layers(image)
+
+
+def place_picture(picture, image, xpos, ypos, width=None, height=None):
+    ''' Copy the layer picture into image without the clipboard.
+
+    The copy is centered in the width x height box at (xpos, ypos), where a
+    paste into a layer of that size put it; without a box its top left is at
+    (xpos, ypos).  Returns the new layer.
+    '''
+    layer = pdb.gimp_layer_new_from_drawable(picture, image)
+    pdb.gimp_image_add_layer(image, layer, -1)
+    if width is not None:
+        xpos = xpos + (width - picture.width) // 2
+    if height is not None:
+        ypos = ypos + (height - picture.height) // 2
+    pdb.gimp_layer_set_offsets(layer, xpos, ypos)
+    return layer
+
+
+def copy_picture(layer, image):
+    ''' Copy the pixels of layer, the picture the plugin was started on, into
+    the new image, centered like a paste.  Opacity, mode and visibility of the
+    operator's layer are not copied.
+    '''
+    copy = place_picture(layer, image, 0, 0, pdb.gimp_image_width(image), pdb.gimp_image_height(image))
+    pdb.gimp_layer_set_opacity(copy, 100)
+    pdb.gimp_layer_set_mode(copy, 0)
+    pdb.gimp_item_set_visible(copy, True)
+    return copy
+
+
+# Function to make one row of copies of picture (a layer) in a new image.
+# Returns the image and its single merged layer.
+def row_picture(picture, xs):
+    row_width = xs[-1] - xs[0] + picture.width
+    row_image = pdb.gimp_image_new(row_width, picture.height, 0)
+    pdb.gimp_image_undo_disable(row_image)
+    for x in xs:
+        place_picture(picture, row_image, x - xs[0], 0)
+    return row_image, pdb.gimp_image_merge_visible_layers(row_image, CLIP_TO_IMAGE)
+
+
+def replicate_picture(orig_image, canvass_image, positions):
+    ''' Put a copy of the (resized) picture in orig_image on every position.
+
+    Instead of copying and pasting the picture once per position, one row of
+    copies is made and that row is copied to every row position, so the work
+    grows with the number of rows instead of the number of copies.  Layers are
+    copied directly between images, the clipboard is not used.
+
+    Parameters:
+    orig_image : image The resized picture.
+    canvass_image : image The sheet.
+    positions : list Top left (x, y) of every copy, see plan.tile_positions.
+
+    Returns the row layers added to canvass_image.
+    '''
+    picture = orig_image.layers[0]
+    rows = {}
+    layers = []
+    try:
+        with frozen(canvass_image):
+            for y, xs in tile_rows(positions):
+                key = tuple(xs)
+                if key not in rows:
+                    rows[key] = row_picture(picture, xs)
+                layers.append(place_picture(rows[key][1], canvass_image, xs[0], y))
+    finally:
+        for row_image, row_layer in rows.values():
+            pdb.gimp_image_delete(row_image)
+    return layers
+
+
+def save_jpeg(image, path, max_bytes=None):
+    ''' Save the flattened image as a JPEG at quality 90, or at the highest
+    lower quality that keeps it within the maximum sheet size (see
+    compression.py).  A sheet that does not fit even at the lowest quality is
+    saved with a warning.  Returns the quality.
+    '''
+    saved = []
+
+    def save(jpeg_quality):
+        pdb.file_jpeg_save(image, image.layers[0], path, path, jpeg_quality / 100.0, 0, 0, 0,
+                           "Creating with GIMP", 0, 0, 0, 0)
+        saved[:] = [jpeg_quality]
+        return os.path.getsize(path)
+
+    max_bytes = max_sheet_bytes(max_bytes)
+    size = save(90)
+    if max_bytes is None or size <= max_bytes:
+        return 90
+    # GIMP only saves whole images, so every try is a full save
+    chosen = search_quality(save, max_bytes, MIN_QUALITY, 89)
+    if saved != [chosen]:
+        size = save(chosen)
+    gimp.message(oversize_warning(os.path.basename(path), size, chosen, max_bytes)
+                 or "Saved at quality %d, %d KB" % (chosen, (size + 1023) // 1024))
+    return chosen
+
+
+def file_uri(path):
+    ''' Return the file:// URI of path, as GIMP 2.10 procedures take. '''
+    return urljoin('file:', pathname2url(os.path.abspath(path)))
+
+
+def convert_for_printer(image, profile=None, intent=None):
+    ''' Convert the resized picture image from sRGB to the printer profile, if
+    there is one (see color.py, default DOUBLESPACE_PRINTER_PROFILE), before
+    it is copied onto a sheet, so the paper around the copies stays white.
+    GIMP converts the picture with its own color management, not a LUT.
+    '''
+    profile = color.printer_profile(profile)
+    if profile is None:
+        return
+    intent = color.INTENTS[color.rendering_intent(intent)]
+    with metrics.stage('color'):
+        if hasattr(pdb, 'gimp_image_convert_color_profile_from_file'):
+            # GIMP 2.10
+            pdb.gimp_image_convert_color_profile_from_file(image, file_uri(profile), intent, 0)
+            # Without its profile the picture counts as sRGB again, so GIMP
+            # copies the converted pixels onto the sheets as they are
+            pdb.gimp_image_set_color_profile(image, 0, [])
+        else:
+            # The lcms plugin of GIMP 2.8
+            pdb.plug_in_icc_profile_apply(image, profile, intent, 0)
+
+
+def show_progress(progress):
+    ''' Report function for a Progress (see progress.py): shows it in GIMP's
+    progress bar, which gimp.progress_init must have started.
+    '''
+    fraction = progress.fraction()
+    if fraction is not None:
+        gimp.progress_update(fraction)
+    pdb.gimp_progress_set_text(progress.describe())
+
+
+def save_outputs(canvass, outputPath, writer, dpi=None):
+    ''' Save the flattened sheet canvass, saved as outputPath at dpi, again at
+    every extra output resolution (see outputs.py).
+    '''
+    dpi = sizes.sheet_dpi(dpi)
+    for output_dpi in output_dpis(None, dpi):
+        factor = output_dpi * 1.0 / dpi
+        small = pdb.gimp_image_duplicate(canvass)
+        pdb.gimp_image_undo_disable(small)
+        try:
+            with metrics.stage('resize'):
+                scale_picture(small, max(1, int(round(pdb.gimp_image_width(canvass) * factor))),
+                              max(1, int(round(pdb.gimp_image_height(canvass) * factor))))
+            pdb.gimp_image_set_resolution(small, output_dpi, output_dpi)
+            path = output_path(outputPath, output_dpi)
+            tempPath = writer.temp_path(path)
+            with metrics.stage('encode', failure='encode'):
+                pdb.file_jpeg_save(small, small.layers[0], tempPath, tempPath, 0.9, 0, 0, 0,
+                                   "Creating with GIMP", 0, 0, 0, 0)
+            metrics.sheet_written(writer.publish(tempPath, path))
+        finally:
+            pdb.gimp_image_delete(small)
+
+
+def preview_sheet(image, canvass_width, canvass_height, copy_width, copy_height, positions, dpi,
+                  rotate=False):
+    ''' Make a low resolution image of the sheet: image is copied, turned if
+    rotate is set, scaled to the copy size at dpi and put on every position.
+    '''
+    factor = preview_factor(dpi)
+    small = pdb.gimp_image_duplicate(image)
+    pdb.gimp_image_undo_disable(small)
+    try:
+        pdb.gimp_image_flatten(small)
+        if rotate:
+            pdb.gimp_image_rotate(small, 0)
+        scale_picture(small, max(1, copy_width * factor), max(1, copy_height * factor), 'bilinear')
+
+        width = max(1, int(canvass_width * factor))
+        height = max(1, int(canvass_height * factor))
+        sheet = pdb.gimp_image_new(width, height, 0)
+        pdb.gimp_image_undo_disable(sheet)
+        background = pdb.gimp_layer_new(sheet, width, height, 0, "Background", 100, 0)
+        pdb.gimp_image_add_layer(sheet, background, -1)
+        pdb.gimp_drawable_fill(background, WHITE_FILL)
+        replicate_picture(small, sheet, scale_positions(positions, factor))
+        pdb.gimp_image_flatten(sheet)
+        pdb.gimp_image_set_resolution(sheet, dpi, dpi)
+    finally:
+        pdb.gimp_image_delete(small)
+    return sheet
+
+
+def ask(question):
+    ''' Ask a yes or no question; without GTK the answer is yes. '''
+    try:
+        import gtk
+    except ImportError:
+        return True
+    dialog = gtk.MessageDialog(None, gtk.DIALOG_MODAL, gtk.MESSAGE_QUESTION, gtk.BUTTONS_YES_NO, question)
+    dialog.set_title("DoubleSpace")
+    response = dialog.run()
+    dialog.destroy()
+    while gtk.events_pending():
+        gtk.main_iteration()
+    return response == gtk.RESPONSE_YES
+
+
+def confirm_preview(image, canvass_width, canvass_height, copy_width, copy_height, positions,
+                    rotate=False):
+    ''' If previews are on (see preview.py), show a preview of the sheet and
+    ask whether to render the full sheet.  Returns False if the operator said
+    no; the preview then stays open.
+    '''
+    dpi = preview_dpi()
+    if dpi is None:
+        return True
+    sheet = preview_sheet(image, canvass_width, canvass_height, copy_width, copy_height, positions,
+                          dpi, rotate)
+    display = pdb.gimp_display_new(sheet)
+    pdb.gimp_displays_flush()
+    if not ask("Render the full sheet?"):
+        gimp.message("Full sheet not rendered")
+        return False
+    # Closing the only display of the preview also deletes it
+    pdb.gimp_display_delete(display)
+    return True
+
+
+# Laplacian for plug_in_convmatrix (5 x 5, the 3 x 3 kernel in the middle)
+LAPLACIAN = [0, 0, 0, 0, 0,
+             0, 0, 1, 0, 0,
+             0, 1, -4, 1, 0,
+             0, 0, 1, 0, 0,
+             0, 0, 0, 0, 0]
+
+
+def score_picture(image):
+    ''' Return the quality.Score of image, computed on a small gray copy. '''
+    small = pdb.gimp_image_duplicate(image)
+    pdb.gimp_image_undo_disable(small)
+    try:
+        pdb.gimp_image_flatten(small)
+        width = pdb.gimp_image_width(small)
+        height = pdb.gimp_image_height(small)
+        scale = min(1.0, quality.SCORE_SIZE * 1.0 / max(width, height))
+        pdb.gimp_image_scale(small, max(1, int(width * scale)), max(1, int(height * scale)))
+        pdb.gimp_image_convert_grayscale(small)
+        drawable = small.layers[0]
+
+        dark = pdb.gimp_histogram(drawable, HISTOGRAM_VALUE, 0, quality.CLIP_LEVELS - 1)[5] * 100.0
+        bright = pdb.gimp_histogram(drawable, HISTOGRAM_VALUE, 256 - quality.CLIP_LEVELS, 255)[5] * 100.0
+
+        # Offset 128 keeps the negative responses
+        pdb.plug_in_convmatrix(small, drawable, len(LAPLACIAN), LAPLACIAN, 0, 1, 128,
+                               5, [1, 1, 1, 1, 0], 0)
+        std_dev = pdb.gimp_histogram(drawable, HISTOGRAM_VALUE, 0, 255)[1]
+    finally:
+        pdb.gimp_image_delete(small)
+    return quality.Score(std_dev * std_dev, dark, bright)
+
+
+def quality_gate(image, outputFolder, source=None):
+    ''' Score image if DOUBLESPACE_QUALITY is set and add it to the report in
+    outputFolder.  Returns False if the picture is rejected.
+    '''
+    report = quality.QualityReport(outputFolder)
+    if report.mode == 'off':
+        return True
+    with metrics.stage('score'):
+        score = score_picture(image)
+    name = source or pdb.gimp_image_get_filename(image) or image.name
+    found = report.add(name, score)
+    report.write()
+    if not found:
+        return True
+    if report.mode == 'reject':
+        metrics.failure('quality')
+        gimp.message("Picture rejected as " + ', '.join(found) + ": " + str(name))
+        return False
+    gimp.message("Picture flagged as " + ', '.join(found) + ": " + str(name))
+    return True
@@ -0,0 +1,136 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Pictures of an input folder or archive.
+
+The folder command takes its pictures from a folder, or straight from a ZIP or
+tar archive (.tar, .tar.gz, .tgz, .tar.bz2, .tar.xz) without extracting it.
+Pictures are taken in name order, including those in sub folders of an archive,
+and decoded from the archive as they are read.
+
+ZIP members are read on the worker threads side by side.  The members of a tar
+archive share one position in the file, so they are read one at a time, each
+into memory (still encoded) before it is decoded.  A compressed tar archive is
+decompressed again from its start for every member that comes before the
+previous one, so those are read fastest when they were added in name order.
+'''
+
+import io
+import os
+import tarfile
+import threading
+import zipfile
+import zlib
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Errors reading a damaged archive member
+ARCHIVE_ERRORS = (zipfile.BadZipfile, tarfile.TarError, EOFError, zlib.error)
+
+
+def is_archive(path):
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+# Function to tell whether an archive member is a picture; skips the resource
+# forks macOS adds to ZIP archives
+def _is_picture(member, extensions):
+    name = member.rsplit('/', 1)[-1]
+    return (name.lower().endswith(extensions) and not name.startswith('._') and
+            not member.startswith('__MACOSX/'))
+
+
+class PictureFolder(object):
+    ''' The pictures of a folder; their names are their paths. '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def names(self, extensions):
+        ''' Return the paths of the files ending in one of extensions, in name order. '''
+        return [os.path.join(self.path, name) for name in sorted(os.listdir(self.path))
+                if name.lower().endswith(extensions)]
+
+    def open(self, name):
+        return open(name, 'rb')
+
+    def close(self):
+        pass
+
+
+class PictureArchive(object):
+    ''' The pictures of a ZIP or tar archive.  Their names are the archive path
+    joined with the member path, e.g. C:\\uploads\\set.zip\\day1\\001.jpg.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.members = {}
+        if zipfile.is_zipfile(path):
+            self.zip = zipfile.ZipFile(path)
+            self.tar = None
+            members = [(info.filename, info.filename) for info in self.zip.infolist()
+                       if not info.filename.endswith('/')]
+        else:
+            self.zip = None
+            self.tar = tarfile.open(path)
+            members = [(info.name, info) for info in self.tar.getmembers() if info.isfile()]
+        for member, entry in members:
+            self.members[os.path.join(path, *member.split('/'))] = (member, entry)
+
+    def names(self, extensions):
+        ''' Return the names of the members ending in one of extensions, in
+        member name order.
+        '''
+        found = [(member, name) for name, (member, entry) in self.members.items()
+                 if _is_picture(member, extensions)]
+        return [name for member, name in sorted(found)]
+
+    def open(self, name):
+        ''' Return a binary, seekable file of the member called name. '''
+        member, entry = self.members[name]
+        if self.zip is not None:
+            return self.zip.open(entry)
+        with self.lock:
+            return io.BytesIO(self.tar.extractfile(entry).read())
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        else:
+            self.tar.close()
+
+
+def open_pictures(path):
+    ''' Return the PictureFolder or PictureArchive for the folder or archive at path. '''
+    if is_archive(path):
+        return PictureArchive(path)
+    return PictureFolder(path)
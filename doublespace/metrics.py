@@ -0,0 +1,261 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Throughput and error metrics of layout runs.
+
+Every run counts the pictures it read, the sheets and bytes it wrote, the time
+spent per stage and its failures by cause.  When the DOUBLESPACE_METRICS
+environment variable (or the path parameter of write_snapshot) names a file,
+the counts are added to that file at the end of the run:
+
+    *.prom  Prometheus text format, for the node exporter textfile collector.
+            The running totals are kept next to it in <name>.prom.json.
+    *.json  JSON snapshot.
+
+Runs that share a snapshot file take turns: each holds a lock on
+<file>.lock while it reads, merges and replaces the totals.  A snapshot
+that can not be written is reported on standard error; the run itself has
+succeeded by then.
+
+Failure causes are 'unreadable' (a picture could not be read), 'aspect' (the
+picture has the wrong size or aspect ratio), 'encode' (a sheet could not be
+saved) and 'other'.
+'''
+
+import os
+import sys
+import json
+import time
+import threading
+
+from doublespace.output import locked, write_text
+
+METRICS_ENV = 'DOUBLESPACE_METRICS'
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_help = {
+    'doublespace_images_read_total': ('counter', 'Pictures read.'),
+    'doublespace_sheets_written_total': ('counter', 'Sheets saved.'),
+    'doublespace_bytes_written_total': ('counter', 'Bytes of saved sheets.'),
+    'doublespace_failures_total': ('counter', 'Failed pictures or sheets by cause.'),
+    'doublespace_stage_seconds': ('histogram', 'Time spent per stage.'),
+}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics(object):
+    ''' Counters and histograms of one process. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def reset(self, **labels):
+        ''' Clear all values; labels are added to everything recorded afterwards. '''
+        with self.lock:
+            self.labels = labels
+            self.counters = {}
+            self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        labels.update(self.labels)
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        labels.update(self.labels)
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'counts': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def state(self):
+        ''' Return the values as a JSON serializable dict. '''
+        with self.lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'buckets': list(BUCKETS),
+                                'counts': list(h['counts']), 'sum': h['sum'], 'count': h['count']}
+                               for (name, labels), h in sorted(self.histograms.items())],
+            }
+
+
+# Metrics of the current run
+registry = Metrics()
+
+
+def image_read():
+    registry.inc('doublespace_images_read_total')
+
+
+def sheet_written(outputPath, size=None):
+    ''' Count a sheet of size bytes, by default the size of the file at outputPath. '''
+    if size is None:
+        size = os.path.getsize(outputPath)
+    registry.inc('doublespace_sheets_written_total')
+    registry.inc('doublespace_bytes_written_total', size)
+
+
+def failure(cause):
+    registry.inc('doublespace_failures_total', cause=cause)
+
+
+def unexpected(err):
+    ''' Count err as an 'other' failure unless a stage already counted it. '''
+    if not getattr(err, 'doublespace_counted', False):
+        failure('other')
+
+
+class stage(object):
+    ''' Context manager that times the enclosed block as stage name.
+
+    If the block raises and failure is given, the exception is counted as a
+    failure with that cause before it is passed on.
+    '''
+
+    def __init__(self, name, failure=None):
+        self.name = name
+        self.failure = failure
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        registry.observe('doublespace_stage_seconds', time.time() - self.started, stage=self.name)
+        if exc_value is not None and self.failure and not getattr(exc_value, 'doublespace_counted', False):
+            failure(self.failure)
+            try:
+                exc_value.doublespace_counted = True
+            except AttributeError:
+                pass
+        return False
+
+
+def _merge(total, state):
+    counters = dict((_key(c['name'], c['labels']), c) for c in total.get('counters', []))
+    for counter in state['counters']:
+        key = _key(counter['name'], counter['labels'])
+        if key in counters:
+            counters[key]['value'] += counter['value']
+        else:
+            counters[key] = counter
+
+    histograms = dict((_key(h['name'], h['labels']), h) for h in total.get('histograms', []))
+    for histogram in state['histograms']:
+        key = _key(histogram['name'], histogram['labels'])
+        if key in histograms and histograms[key]['buckets'] == histogram['buckets']:
+            merged = histograms[key]
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+        else:
+            histograms[key] = histogram
+
+    return {'counters': [counters[key] for key in sorted(counters)],
+            'histograms': [histograms[key] for key in sorted(histograms)]}
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(labels[name]).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name in sorted(labels)) + '}'
+
+
+def prometheus_text(state):
+    ''' Return state in the Prometheus text exposition format. '''
+    lines = []
+    seen = set()
+
+    def header(name):
+        if name not in seen and name in _help:
+            seen.add(name)
+            lines.append('# HELP %s %s' % (name, _help[name][1]))
+            lines.append('# TYPE %s %s' % (name, _help[name][0]))
+
+    for counter in state['counters']:
+        header(counter['name'])
+        lines.append('%s%s %s' % (counter['name'], _labels(counter['labels']), counter['value']))
+
+    for histogram in state['histograms']:
+        name = histogram['name']
+        header(name)
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            lines.append('%s_bucket%s %d' % (name, _labels(histogram['labels'], le=bound), count))
+        lines.append('%s_bucket%s %d' % (name, _labels(histogram['labels'], le='+Inf'), histogram['count']))
+        lines.append('%s_sum%s %.6f' % (name, _labels(histogram['labels']), histogram['sum']))
+        lines.append('%s_count%s %d' % (name, _labels(histogram['labels']), histogram['count']))
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_snapshot(path=None):
+    ''' Add the current run to the snapshot at path (or DOUBLESPACE_METRICS).
+
+    Does nothing if neither is set.
+    '''
+    path = path or os.environ.get(METRICS_ENV)
+    if not path:
+        return
+
+    state_path = path if path.lower().endswith('.json') else path + '.json'
+    try:
+        with locked(path + '.lock'):
+            total = {}
+            if os.path.exists(state_path):
+                try:
+                    with open(state_path) as f:
+                        total = json.load(f)
+                except ValueError:
+                    total = {}
+            total = _merge(total, registry.state())
+
+            write_text(state_path, json.dumps(total, indent=2, sort_keys=True))
+            if state_path != path:
+                write_text(path, prometheus_text(total))
+    except (IOError, OSError) as err:
+        sys.stderr.write("Could not write metrics to %s: %s\n" % (path, err))
@@ -0,0 +1,127 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Output file names that do not collide.
+
+Names used to be doublespace_image_<date>.jpg, so two sheets saved within the
+same second overwrote each other.  Now every run gets a random token and every
+sheet of a run a number:
+
+    doublespace_image_<YYYYmmdd_HHMMSS>_<run token>_<sheet>.jpg
+
+which stays unique when several plugins or batch workers save into the same
+folder at the same time.  Names still sort by date.
+
+With DOUBLESPACE_NAMING=content (or content=True) sheets are named after a hash
+of their bytes instead, doublespace_image_<hash>.jpg, so the same sheet always
+gets the same name.
+'''
+
+import os
+import hashlib
+import binascii
+import threading
+from datetime import datetime
+
+NAMING_ENV = 'DOUBLESPACE_NAMING'
+
+PREFIX = "doublespace_image"
+EXTENSION = ".jpg"
+
+
+def run_token():
+    ''' Random token that tells the runs apart. '''
+    return binascii.hexlify(os.urandom(4)).decode('ascii')
+
+
+def content_naming(content=None):
+    if content is None:
+        return os.environ.get(NAMING_ENV, '').strip().lower() == 'content'
+    return bool(content)
+
+
+def digest(data):
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()[:16]
+
+
+class SheetNamer(object):
+    ''' Hands out the output paths of one run.
+
+    Parameters:
+    outputFolder : string The folder in which the sheets are saved.
+    prefix, extension : string Start and end of every file name.
+    content : bool Name sheets after their contents; None reads DOUBLESPACE_NAMING.
+    '''
+
+    def __init__(self, outputFolder, prefix=PREFIX, extension=EXTENSION, content=None):
+        self.outputFolder = outputFolder
+        self.prefix = prefix
+        self.extension = extension
+        self.content = content_naming(content)
+        self.run = datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + run_token()
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def next_path(self, data=None, copy_number=1):
+        ''' Return the path for the next sheet.
+
+        In content mode, and if the encoded sheet is given as data, the name is
+        made from its hash; copy_number tells apart extra copies of one sheet.
+        '''
+        if self.content and data is not None:
+            name = self.prefix + "_" + digest(data)
+            if copy_number > 1:
+                name = name + "_" + str(copy_number)
+            return os.path.join(self.outputFolder, name + self.extension)
+
+        with self.lock:
+            self.counter = self.counter + 1
+            counter = self.counter
+        name = self.prefix + "_" + self.run + "_" + str(counter) + self.extension
+        return os.path.join(self.outputFolder, name)
+
+    def final_path(self, path, saved_path=None):
+        ''' Return the name a saved sheet should get.
+
+        Only differs from path in content mode, for sheets saved without
+        knowing their bytes in advance (the GIMP plugins); saved_path is where
+        the sheet was saved to, path by default.
+        '''
+        if not self.content:
+            return path
+        return os.path.join(self.outputFolder, self.prefix + "_" + file_digest(saved_path or path) + self.extension)
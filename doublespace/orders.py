@@ -0,0 +1,116 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Order files for batch runs.
+
+An order file lists the pictures to lay out, one order per row.  CSV files need
+a header row, JSON files hold a list of objects (or {"orders": [...]}):
+
+    source,picture_size,paper_size,copies
+    photos/0001.jpg,1 x 1,4R,2
+    photos/0002.jpg,PH Passport,A4,1
+
+copies is the number of sheets to write and defaults to 1.  Relative source
+paths are relative to the folder of the order file.
+'''
+
+import os
+import sys
+import csv
+import json
+from collections import namedtuple
+
+from doublespace import sizes
+
+Order = namedtuple('Order', ['source', 'picture_size', 'paper_size', 'copies'])
+
+# Accepted spellings of the column names
+_columns = {
+    'source': ('source', 'path', 'file'),
+    'picture_size': ('picture_size', 'picture'),
+    'paper_size': ('paper_size', 'paper'),
+    'copies': ('copies',),
+}
+
+
+def _field(row, name):
+    for column in _columns[name]:
+        value = row.get(column)
+        if value is not None and str(value).strip() != '':
+            return str(value).strip()
+    return None
+
+
+def _make_order(row, base_folder, where):
+    source = _field(row, 'source')
+    picture_size = _field(row, 'picture_size')
+    paper_size = _field(row, 'paper_size')
+    copies = _field(row, 'copies') or '1'
+
+    if source is None or picture_size is None or paper_size is None:
+        raise ValueError(where + ": source, picture_size and paper_size are required")
+    try:
+        picture_size = sizes.picture_name(picture_size)
+        paper_size = sizes.paper_name(paper_size)
+        copies = int(copies)
+    except ValueError as err:
+        raise ValueError(where + ": " + str(err))
+    if copies < 1:
+        raise ValueError(where + ": copies should be at least 1")
+
+    if not os.path.isabs(source):
+        source = os.path.join(base_folder, source)
+    return Order(os.path.normpath(source), picture_size, paper_size, copies)
+
+
+def read_orders(path):
+    ''' Read the orders in the CSV or JSON file at path.
+
+    Returns a list of Order tuples.  Raises ValueError on bad rows.
+    '''
+    base_folder = os.path.dirname(os.path.abspath(path))
+
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get('orders', [])
+        return [_make_order(row, base_folder, "Order " + str(number))
+                for number, row in enumerate(rows, 1)]
+
+    if sys.version_info[0] < 3:
+        f = open(path, 'rb')
+    else:
+        f = open(path, newline='')
+    with f:
+        rows = csv.DictReader(f)
+        rows.fieldnames = [name.strip().lower() for name in rows.fieldnames or []]
+        return [_make_order(row, base_folder, "Line " + str(number))
+                for number, row in enumerate(rows, 2)]
@@ -0,0 +1,205 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Crash-safe saving of sheets.
+
+A sheet is first written to a temporary file next to its final path and then
+renamed, so a crash never leaves a truncated JPEG under a name the print
+spooler picks up.  How hard the data is pushed to disk is set by the
+durability policy, the durability parameter or DOUBLESPACE_DURABILITY:
+
+    file   fsync every sheet (and its folder) before it gets its name
+    batch  fsync all sheets of a run once at the end (default)
+    none   leave it to the operating system
+
+With a spool sink (see spool.py) sheets written by SheetWriter.write go to the
+print spool instead of the output folder.
+'''
+
+import os
+import binascii
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+DURABILITY_ENV = 'DOUBLESPACE_DURABILITY'
+
+DURABILITIES = ['file', 'batch', 'none']
+
+DEFAULT_DURABILITY = 'batch'
+
+
+def durability_policy(durability=None):
+    if durability is None:
+        durability = os.environ.get(DURABILITY_ENV, '')
+    durability = str(durability).strip().lower() or DEFAULT_DURABILITY
+    if durability not in DURABILITIES:
+        raise ValueError("Unknown durability: " + durability + " (use one of " + ", ".join(DURABILITIES) + ")")
+    return durability
+
+
+def fsync_path(path):
+    ''' Flush a file, or on POSIX a folder, to disk. '''
+    if os.path.isdir(path):
+        if os.name == 'nt':
+            # Folders can not be opened on Windows; renames are journaled by NTFS
+            return
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace(source, destination):
+    ''' Rename source to destination, replacing it if it exists. '''
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+@contextmanager
+def locked(path):
+    ''' Hold an exclusive lock on path, a file of its own, while the block
+    runs, so processes that share a file take turns.
+    '''
+    f = open(path, 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except (IOError, OSError):
+                    # LK_LOCK gives up after 10 seconds
+                    pass
+        yield
+    finally:
+        # Closing the file releases the lock
+        f.close()
+
+
+def write_text(path, text):
+    ''' Replace the file at path with text.  The text is written next to it
+    under a name of its own and renamed, so readers never see half a file.
+    '''
+    folder, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=folder)
+    try:
+        # mkstemp makes files only their owner can read, e.g. not the node exporter
+        mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class SheetWriter(object):
+    ''' Saves the sheets of one run.
+
+    Parameters:
+    durability : string 'file', 'batch' or 'none'; None reads DOUBLESPACE_DURABILITY.
+    spool : object Sink to send the sheets to instead, see spool.spool_sink.
+    '''
+
+    def __init__(self, durability=None, spool=None):
+        self.durability = durability_policy(durability)
+        self.spool = spool
+        self.pending = []
+        self.temp_paths = set()
+
+    def temp_path(self, outputPath):
+        ''' Return a temporary path to save the sheet for outputPath to. '''
+        token = binascii.hexlify(os.urandom(4)).decode('ascii')
+        temp_path = outputPath + "." + token + ".part"
+        self.temp_paths.add(temp_path)
+        return temp_path
+
+    def publish(self, temp_path, outputPath):
+        ''' Give the saved temporary file its final name; returns outputPath. '''
+        if self.durability == 'file':
+            fsync_path(temp_path)
+        replace(temp_path, outputPath)
+        self.temp_paths.discard(temp_path)
+        if self.durability == 'file':
+            fsync_path(os.path.dirname(os.path.abspath(outputPath)))
+        elif self.durability == 'batch':
+            self.pending.append(outputPath)
+        return outputPath
+
+    def write(self, data, outputPath):
+        ''' Save the encoded sheet data as outputPath, or send it to the
+        spool under the name of outputPath. '''
+        if self.spool is not None:
+            self.spool.send(data, os.path.basename(outputPath))
+            return outputPath
+        temp_path = self.temp_path(outputPath)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self.publish(temp_path, outputPath)
+
+    def sync(self):
+        ''' Flush the sheets saved since the last sync (batch durability). '''
+        pending, self.pending = self.pending, []
+        folders = set()
+        for path in pending:
+            if os.path.exists(path):
+                fsync_path(path)
+                folders.add(os.path.dirname(os.path.abspath(path)))
+        for folder in folders:
+            fsync_path(folder)
+
+    def close(self):
+        ''' Sync, and remove temporary files of sheets that failed to save. '''
+        if self.spool is not None:
+            self.spool.close()
+        self.sync()
+        for temp_path in list(self.temp_paths):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.temp_paths = set()
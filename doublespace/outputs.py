@@ -0,0 +1,78 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Extra output resolutions of every sheet.
+
+Besides the sheet at its own resolution (see sizes.sheet_dpi), a run can save
+the same sheet at lower resolutions, e.g. 300 dpi for the archive and 40 dpi
+as a thumbnail for the order system next to a 600 dpi sheet for the printer.
+They are set by the outputs parameter or DOUBLESPACE_OUTPUTS, a comma separated
+list of resolutions such as "300,40", and saved next to the sheet as
+<sheet>_<dpi>dpi.jpg.
+
+The headless engine puts copies resized from the full resolution copy on a
+sheet of each size, so pictures are decoded and resized once; the plugins
+scale the finished sheet.
+'''
+
+import os
+
+from doublespace import sizes
+
+OUTPUTS_ENV = 'DOUBLESPACE_OUTPUTS'
+
+
+def output_dpis(value=None, sheet_dpi=None):
+    ''' Return the extra resolutions, highest first; they must be below the
+    sheet resolution.
+    '''
+    if value is None:
+        value = os.environ.get(OUTPUTS_ENV, '')
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(dpi) for dpi in value)
+    sheet_dpi = sizes.sheet_dpi(sheet_dpi)
+    dpis = set()
+    for dpi in str(value).split(','):
+        dpi = dpi.strip().lower()
+        if dpi.endswith('dpi'):
+            dpi = dpi[:-3]
+        if not dpi:
+            continue
+        dpi = int(dpi)
+        if dpi < 1 or dpi >= sheet_dpi:
+            raise ValueError("Output resolution %d must be below the sheet's %d dpi" % (dpi, sheet_dpi))
+        dpis.add(dpi)
+    return sorted(dpis, reverse=True)
+
+
+def output_path(outputPath, dpi):
+    ''' Path of the dpi version of the sheet saved as outputPath. '''
+    base, extension = os.path.splitext(outputPath)
+    return "%s_%ddpi%s" % (base, dpi, extension)
@@ -0,0 +1,187 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Layout plans: where the copies of a picture go on a sheet.
+
+The positions follow the same fill order as the loops in the plugins: copies are
+placed left to right starting at (start_x, start_y), and a new row is started
+once the next copy would not fit anymore.
+'''
+
+from doublespace import sizes
+
+
+class LayoutPlan(object):
+    ''' Sheet layout for one picture size on one paper size.
+
+    Parameters:
+    picture_size : string Picture name (see sizes.PICTURES).
+    paper_size : string Paper name (see sizes.PAPERS).
+    canvass_width, canvass_height : int Sheet size in pixels.
+    copy_width, copy_height : int Size of one copy in pixels.
+    positions : list Top left (x, y) of every copy.
+    keep_aspect : bool Resize copies to copy_width and keep the aspect ratio.
+    rotate_portrait : bool Turn portrait sources to landscape first.
+    dpi : int Resolution the pixel sizes are for.
+    '''
+
+    def __init__(self, picture_size, paper_size, canvass_width, canvass_height,
+                 copy_width, copy_height, positions, keep_aspect=False, rotate_portrait=False,
+                 dpi=sizes.BASE_DPI):
+        self.picture_size = picture_size
+        self.paper_size = paper_size
+        self.canvass_width = canvass_width
+        self.canvass_height = canvass_height
+        self.copy_width = copy_width
+        self.copy_height = copy_height
+        self.positions = positions
+        self.keep_aspect = keep_aspect
+        self.rotate_portrait = rotate_portrait
+        self.dpi = dpi
+
+    def __repr__(self):
+        return "LayoutPlan(%r on %r at %d dpi, %d copies)" % (self.picture_size, self.paper_size,
+                                                             self.dpi, len(self.positions))
+
+
+# Function to compute the copy positions the same way the plugin loops do
+def tile_positions(canvass_width, canvass_height, copy_width, copy_height,
+                   start_x, start_y, step_x, copy_interval=sizes.copy_interval):
+    positions = []
+    current_position_x = start_x
+    current_position_y = start_y
+    while (1):
+        positions.append((current_position_x, current_position_y))
+        current_position_x = current_position_x + step_x
+
+        if current_position_x > canvass_width - (copy_width + copy_interval):
+            current_position_x = start_x
+            current_position_y = current_position_y + copy_height + copy_interval
+
+            if current_position_y > canvass_height - (copy_height + copy_interval):
+                break
+    return positions
+
+
+# Function to group positions into rows: a list of (y, [x, ...]) from top to bottom
+def tile_rows(positions):
+    rows = []
+    for x, y in positions:
+        if rows and rows[-1][0] == y:
+            rows[-1][1].append(x)
+        else:
+            rows.append((y, [x]))
+    return rows
+
+
+# Function to scale a list of positions by factor
+def scale_positions(positions, factor):
+    return [(int(round(x * factor)), int(round(y * factor))) for x, y in positions]
+
+
+def scaled_plan(plan, factor):
+    ''' Return plan with all sizes and positions scaled by factor, e.g. for a
+    preview at a lower resolution.  Copies keep at least one pixel.
+    '''
+    def scale(value):
+        return max(1, int(round(value * factor)))
+    return LayoutPlan(plan.picture_size, plan.paper_size,
+                      scale(plan.canvass_width), scale(plan.canvass_height),
+                      scale(plan.copy_width), scale(plan.copy_height),
+                      scale_positions(plan.positions, factor),
+                      plan.keep_aspect, plan.rotate_portrait,
+                      max(1, int(round(plan.dpi * factor))))
+
+
+def aligned_plan(plan, step):
+    ''' Return plan with every position moved up and left onto a multiple of
+    step pixels, e.g. onto the blocks of a JPEG.  Copies move by less than step.
+    '''
+    return LayoutPlan(plan.picture_size, plan.paper_size,
+                      plan.canvass_width, plan.canvass_height,
+                      plan.copy_width, plan.copy_height,
+                      [(x // step * step, y // step * step) for x, y in plan.positions],
+                      plan.keep_aspect, plan.rotate_portrait, plan.dpi)
+
+
+def layout_plan(picture_size, paper_size, dpi=None):
+    ''' Build the plan for picture_size copies on paper_size at dpi (see
+    sizes.sheet_dpi).
+
+    Square and passport pictures use the "ID Custom Sizes" layout, 2R pictures
+    the "Image to 2R" layout.
+    '''
+    picture_size = sizes.picture_name(picture_size)
+    paper_size = sizes.paper_name(paper_size)
+    dpi = sizes.sheet_dpi(dpi)
+
+    canvass_width, canvass_height = sizes.paper_pixels(paper_size, dpi)
+    copy_width, copy_height = sizes.picture_pixels(picture_size, dpi)
+    copy_interval = sizes.gutter_pixels(dpi)
+    margin = sizes.margin_pixels(dpi)
+
+    start_x = copy_interval + margin
+    start_y = copy_interval
+    if picture_size == '2R':
+        start_y = copy_interval + margin
+
+    positions = tile_positions(canvass_width, canvass_height, copy_width, copy_height,
+                               start_x, start_y, copy_width + copy_interval, copy_interval)
+
+    return LayoutPlan(picture_size, paper_size, canvass_width, canvass_height,
+                      copy_width, copy_height, positions,
+                      keep_aspect=(picture_size == '2R'),
+                      rotate_portrait=(picture_size == '2R'),
+                      dpi=dpi)
+
+
+def check_source_size(img_width, img_height, picture_size):
+    ''' Return an error message if a source of img_width x img_height can not be
+    used for picture_size, or None if it is fine.
+    '''
+    picture_size = sizes.picture_name(picture_size)
+
+    if picture_size == '2R':
+        return None
+
+    if picture_size == 'PH Passport':
+        if img_height == img_width:
+            return "Image is a square!  Not suitable for PH passport!"
+        passport_ratio = round(531/411.0, 2)
+        ratio = round(img_height * 1.0 / img_width, 2)
+        if ratio != passport_ratio:
+            return "Image size is not suitable for PH passport!"
+        return None
+
+    if img_height != img_width:
+        return "Image is not a perfect square!"
+    if img_height < sizes.min_source_size:
+        return "Minimum size should be " + str(sizes.min_source_size) + " X " + str(sizes.min_source_size) + " pixels"
+    return None
@@ -0,0 +1,100 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Pool of blank canvasses, so a batch does not allocate a new sheet per page.
+
+The pool does not know what a canvass is; it is given functions to create,
+clear and throw away one, which lets the GIMP plugins and the headless engine
+share it.
+'''
+
+import threading
+
+
+class CanvassPool(object):
+    ''' Keeps released canvasses per size and hands them out again.
+
+    Parameters:
+    create : function create(width, height) returns a new white canvass.
+    clear : function clear(canvass, *args) makes a used canvass white again;
+        args are the ones given to release, e.g. the areas that were drawn on.
+    discard : function discard(canvass) frees a canvass that is not kept.
+    keep : int How many free canvasses to keep per size.
+    '''
+
+    def __init__(self, create, clear, discard=None, keep=2):
+        self.create = create
+        self.clear = clear
+        self.discard = discard
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.free = {}
+        self.sizes = {}
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, width, height):
+        ''' Return a white canvass of width x height. '''
+        key = (width, height)
+        with self.lock:
+            free = self.free.get(key)
+            if free:
+                canvass = free.pop()
+                self.reused = self.reused + 1
+            else:
+                canvass = None
+                self.created = self.created + 1
+        if canvass is None:
+            canvass = self.create(width, height)
+        with self.lock:
+            self.sizes[id(canvass)] = key
+        return canvass
+
+    def release(self, canvass, *clear_args):
+        ''' Give canvass back to the pool once it has been saved. '''
+        with self.lock:
+            key = self.sizes.pop(id(canvass))
+            keep = len(self.free.get(key, ())) < self.keep
+        if not keep:
+            if self.discard is not None:
+                self.discard(canvass)
+            return
+        self.clear(canvass, *clear_args)
+        with self.lock:
+            self.free.setdefault(key, []).append(canvass)
+
+    def close(self):
+        ''' Throw away all free canvasses. '''
+        with self.lock:
+            free = [canvass for canvasses in self.free.values() for canvass in canvasses]
+            self.free = {}
+        if self.discard is not None:
+            for canvass in free:
+                self.discard(canvass)
@@ -0,0 +1,186 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Read-ahead of batch inputs on background threads.
+
+While the current picture is laid out, the next ones are already being read
+(and, in the headless engine, decoded), so disk or network reads overlap with
+the work on the sheet.  The depth, how many pictures are read ahead, comes from
+the depth parameter or DOUBLESPACE_PREFETCH (default 2, 0 turns it off).
+'''
+
+import os
+import sys
+import threading
+from collections import deque
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+PREFETCH_ENV = 'DOUBLESPACE_PREFETCH'
+
+DEFAULT_DEPTH = 2
+
+# Block size used by read_ahead
+READ_BLOCK = 1 << 20
+
+
+def prefetch_depth(depth=None):
+    if depth is None:
+        depth = os.environ.get(PREFETCH_ENV, '').strip() or DEFAULT_DEPTH
+    return max(0, int(depth))
+
+
+def read_ahead(path):
+    ''' Read the file at path and throw the data away, so that it sits in the
+    operating system's cache when it is opened for real.  Returns its size.
+    '''
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                return size
+            size = size + len(block)
+
+
+# The Loaded a thread is running the load function for, see wanted()
+_running = threading.local()
+
+
+def wanted():
+    ''' Return an event that is set once the consumer waits for the item being
+    loaded, or None outside of a Prefetcher.  A load function that waits for
+    something the consumer gives back (e.g. memory) must stop waiting then.
+    '''
+    loaded = getattr(_running, 'loaded', None)
+    return loaded.wanted if loaded is not None else None
+
+
+class Loaded(object):
+    ''' Result of loading one item; get() returns it or raises its error. '''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.wanted = threading.Event()
+        self.value = None
+        self.error = None
+
+    def run(self, load, item):
+        _running.loaded = self
+        try:
+            self.value = load(item)
+        except Exception:
+            self.error = sys.exc_info()[1]
+        finally:
+            _running.loaded = None
+        self.done.set()
+
+    def wait(self):
+        self.wanted.set()
+        self.done.wait()
+
+    def get(self):
+        self.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def take(self):
+        ''' Like get(), but lets go of the result so it can be freed once used. '''
+        value = self.get()
+        self.value = None
+        return value
+
+
+class Prefetcher(object):
+    ''' Iterates over (item, Loaded) for items, in order, running load(item)
+    on background threads up to depth items ahead of the consumer.
+
+    Parameters:
+    items : list The items to load, e.g. file paths.
+    load : function Called with one item on a background thread.
+    depth : int How many items to load ahead; None reads DOUBLESPACE_PREFETCH.
+    '''
+
+    def __init__(self, items, load, depth=None):
+        self.items = list(items)
+        self.load = load
+        self.depth = prefetch_depth(depth)
+
+    def __iter__(self):
+        if self.depth == 0:
+            for item in self.items:
+                loaded = Loaded()
+                loaded.wanted.set()
+                loaded.run(self.load, item)
+                yield item, loaded
+            return
+
+        tasks = Queue()
+
+        def worker():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                task[0].run(self.load, task[1])
+
+        threads = [threading.Thread(target=worker, name='doublespace-prefetch')
+                   for _ in range(min(self.depth, len(self.items)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        pending = deque()
+
+        def submit(item):
+            loaded = Loaded()
+            pending.append((item, loaded))
+            tasks.put((loaded, item))
+
+        try:
+            upcoming = iter(self.items)
+            for item in upcoming:
+                submit(item)
+                if len(pending) > self.depth:
+                    break
+            while pending:
+                item, loaded = pending.popleft()
+                loaded.wait()
+                for next_item in upcoming:
+                    submit(next_item)
+                    break
+                yield item, loaded
+        finally:
+            for thread in threads:
+                tasks.put(None)
@@ -0,0 +1,65 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Low resolution previews of a sheet.
+
+A preview is the same layout at 72 to 150 dpi instead of the full resolution,
+made from a small copy of the picture, so a wrong photo can be spotted before
+the full sheet is rendered.  In GIMP it is turned on with DOUBLESPACE_PREVIEW=1
+(150 dpi) or DOUBLESPACE_PREVIEW=<dpi>; the plugins then show the preview and
+only render the full sheet once it is confirmed.
+'''
+
+import os
+
+from doublespace import sizes
+
+PREVIEW_ENV = 'DOUBLESPACE_PREVIEW'
+
+DEFAULT_DPI = 150
+MIN_DPI = 72
+MAX_DPI = 150
+
+
+def preview_dpi(value=None):
+    ''' Return the preview resolution, or None if previews are off. '''
+    if value is None:
+        value = os.environ.get(PREVIEW_ENV, '').strip()
+    value = str(value).strip().lower()
+    if value in ('', '0', 'off', 'no', 'false'):
+        return None
+    if value in ('1', 'on', 'yes', 'true'):
+        return DEFAULT_DPI
+    return min(MAX_DPI, max(MIN_DPI, int(value)))
+
+
+def preview_factor(dpi, sheet_dpi=None):
+    ''' Scale of a preview at dpi relative to a full sheet at sheet_dpi (see sizes.sheet_dpi). '''
+    return dpi * 1.0 / sizes.sheet_dpi(sheet_dpi)
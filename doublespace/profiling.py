@@ -0,0 +1,204 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Opt-in profiling of layout runs.
+
+Profiling is off unless the DOUBLESPACE_PROFILE environment variable (or the
+mode parameter) is set:
+
+    1, on, cprofile  cProfile plus stack sampling
+    sample           stack sampling only (low overhead, for production runs)
+
+A profiled run writes into its output folder:
+
+    doublespace_profile_<template>_<stamp>_<token>.prof       pstats file (cProfile only)
+    doublespace_profile_<template>_<stamp>_<token>.collapsed  sampled stacks, one
+                                                              "frame;frame;frame count"
+                                                              line per stack, for
+                                                              flamegraph.pl or speedscope
+    doublespace_profile_totals.json                           runs and seconds per template
+
+The token is random per run (see naming.run_token), so runs of a template that
+end in the same second keep their own files.  Runs that share an output folder
+take turns on the totals through doublespace_profile_totals.json.lock, like
+metrics snapshots.  Profile files that can not be written are reported on
+standard error and do not fail the run.
+'''
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+
+from doublespace.naming import run_token
+from doublespace.output import locked, write_text
+
+try:
+    import cProfile
+except ImportError:
+    cProfile = None
+
+PROFILE_ENV = 'DOUBLESPACE_PROFILE'
+TOTALS_FILE = 'doublespace_profile_totals.json'
+
+# Seconds between two stack samples
+SAMPLE_INTERVAL = 0.005
+
+
+def profile_mode(mode=None):
+    ''' Return 'cprofile', 'sample' or None for mode, or for the environment
+    variable when mode is None.
+    '''
+    if mode is None:
+        mode = os.environ.get(PROFILE_ENV, '')
+    mode = str(mode).strip().lower()
+    if mode in ('', '0', 'off', 'no', 'false', 'none'):
+        return None
+    if mode == 'sample':
+        return 'sample'
+    return 'cprofile'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno)
+
+
+class StackSampler(object):
+    ''' Samples the stack of one thread from a background thread.
+
+    Parameters:
+    thread_id : int Thread to sample, the calling thread by default.
+    interval : float Seconds between samples.
+    '''
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        if thread_id is None:
+            thread_id = threading.current_thread().ident
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='doublespace-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack in sorted(self.counts):
+                f.write("%s %d\n" % (stack, self.counts[stack]))
+
+
+def _add_totals(outputFolder, template, seconds):
+    path = os.path.join(outputFolder, TOTALS_FILE)
+    with locked(path + '.lock'):
+        totals = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    totals = json.load(f)
+            except ValueError:
+                totals = {}
+        entry = totals.setdefault(template, {'runs': 0, 'seconds': 0.0})
+        entry['runs'] = entry['runs'] + 1
+        entry['seconds'] = round(entry['seconds'] + seconds, 6)
+        entry['mean_seconds'] = round(entry['seconds'] / entry['runs'], 6)
+        write_text(path, json.dumps(totals, indent=2, sort_keys=True))
+
+
+class profile_run(object):
+    ''' Context manager that profiles the enclosed block when profiling is on.
+
+    Parameters:
+    template : string Name of the layout, used in file names and totals.
+    outputFolder : string Folder in which to write the profile files.
+    mode : string See profile_mode; None reads the environment variable.
+    '''
+
+    def __init__(self, template, outputFolder, mode=None):
+        self.template = template
+        self.outputFolder = outputFolder
+        self.mode = profile_mode(mode)
+        self.profiler = None
+        self.sampler = None
+
+    def __enter__(self):
+        if self.mode is None:
+            return self
+        self.started = time.time()
+        self.sampler = StackSampler()
+        self.sampler.start()
+        if self.mode == 'cprofile' and cProfile is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.mode is None:
+            return False
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.sampler.stop()
+        seconds = time.time() - self.started
+
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.outputFolder, "doublespace_profile_" + self.template + "_" + stamp +
+                            "_" + run_token())
+        try:
+            if self.profiler is not None:
+                self.profiler.dump_stats(base + ".prof")
+            self.sampler.write_collapsed(base + ".collapsed")
+            _add_totals(self.outputFolder, self.template, seconds)
+        except (IOError, OSError) as err:
+            # The run has succeeded or failed by now; the profile is extra
+            sys.stderr.write("Could not write profile to %s: %s\n" % (self.outputFolder, err))
+        return False
+
@@ -0,0 +1,156 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Progress of long runs, and stopping them early.
+
+A run counts the pictures it is done with (laid out, skipped or failed) and the
+sheets it saved.  The report function is given the Progress after every saved
+sheet and otherwise at most every INTERVAL seconds: the GIMP plugins show it in
+GIMP's progress bar, the command line prints it with --progress.
+
+Runs stop cooperatively.  Before they take the next picture they ask whether
+they were cancelled; if so, they finish the sheet they are on and stop, keeping
+every saved sheet.  A run is cancelled by Progress.cancel (the command line does
+so on the first Ctrl+C) or by creating a file named doublespace.stop in its
+output folder, which also works for a run inside GIMP.
+'''
+
+import os
+import time
+import signal
+import threading
+from contextlib import contextmanager
+
+STOP_FILE = 'doublespace.stop'
+
+# Seconds between two reports while no sheet is saved
+INTERVAL = 1.0
+
+
+def _clock(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return "%d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    return "%d:%02d" % (seconds // 60, seconds % 60)
+
+
+class Progress(object):
+    ''' Progress of one run.
+
+    Parameters:
+    report : function Called with the Progress, see above; None for no reports.
+    outputFolder : string The run's output folder, watched for the stop file.
+    interval : float Seconds between reports while no sheet is saved.
+    '''
+
+    def __init__(self, report=None, outputFolder=None, interval=INTERVAL):
+        self.report = report
+        self.interval = interval
+        self.stop_path = os.path.join(outputFolder, STOP_FILE) if outputFolder else None
+        self.stop = threading.Event()
+        self.start()
+
+    def start(self, total=None):
+        ''' Begin counting a run of total pictures (None if not known).  A stop
+        file left over from an earlier run is removed.
+        '''
+        self.total = total
+        self.pictures = 0
+        self.sheets = 0
+        self.started = time.time()
+        self.reported = self.started
+        self._remove_stop_file()
+
+    def _remove_stop_file(self):
+        if self.stop_path is not None and os.path.exists(self.stop_path):
+            try:
+                os.remove(self.stop_path)
+            except OSError:
+                pass
+
+    def cancel(self):
+        ''' Ask the run to stop after the current sheet. '''
+        self.stop.set()
+
+    @property
+    def cancelled(self):
+        if not self.stop.is_set() and self.stop_path is not None and os.path.exists(self.stop_path):
+            self._remove_stop_file()
+            self.stop.set()
+        return self.stop.is_set()
+
+    def done(self, pictures=1, sheets=0):
+        ''' Count pictures more done and sheets more saved, and report. '''
+        self.pictures = self.pictures + pictures
+        self.sheets = self.sheets + sheets
+        now = time.time()
+        if self.report is not None and (sheets or now - self.reported >= self.interval):
+            self.reported = now
+            self.report(self)
+
+    def fraction(self):
+        ''' Return the part of the pictures done, from 0.0 to 1.0, or None. '''
+        if not self.total:
+            return None
+        return min(1.0, self.pictures * 1.0 / self.total)
+
+    def eta(self):
+        ''' Return the seconds still to go at the rate so far, or None. '''
+        if not self.total or not self.pictures:
+            return None
+        return (time.time() - self.started) * (self.total - self.pictures) / self.pictures
+
+    def describe(self):
+        ''' Return a one line summary, e.g. "12/40 pictures, 6 sheets, 0:32 left". '''
+        text = "%d%s pictures, %d sheets" % (self.pictures, '/' + str(self.total) if self.total else '',
+                                             self.sheets)
+        eta = self.eta()
+        if eta is not None and self.pictures < self.total:
+            text = text + ", " + _clock(eta) + " left"
+        return text
+
+
+@contextmanager
+def interrupt_cancels(progress, log=None):
+    ''' Make the first Ctrl+C cancel progress instead of stopping at once; a
+    second one interrupts as usual.  Only works on the main thread.
+    '''
+    def interrupted(signum, frame):
+        if progress.stop.is_set():
+            raise KeyboardInterrupt()
+        progress.cancel()
+        if log is not None:
+            log("Stopping after the current sheet, press Ctrl+C again to stop at once")
+
+    previous = signal.signal(signal.SIGINT, interrupted)
+    try:
+        yield progress
+    finally:
+        signal.signal(signal.SIGINT, previous)
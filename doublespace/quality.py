@@ -0,0 +1,132 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Sharpness and exposure check of the pictures before they are laid out.
+
+Every picture is scored on a small decode (at most SCORE_SIZE pixels wide or
+high, in gray):
+
+    sharpness  variance of the Laplacian; blurry pictures have few edges
+    dark       percentage of pixels at the bottom CLIP_LEVELS levels
+    bright     percentage of pixels at the top CLIP_LEVELS levels
+
+DOUBLESPACE_QUALITY (or the quality argument) sets what happens to pictures
+that fail: 'flag' lays them out anyway and only reports them, 'reject' skips
+them, 'off' (the default) does not score at all.  Scores of checked pictures
+are added to doublespace_quality.csv in the output folder.
+
+This module only judges the scores; engine.score_picture and
+gimp_ops.score_picture compute them.
+'''
+
+import os
+import csv
+import sys
+from collections import namedtuple
+from datetime import datetime
+
+QUALITY_ENV = 'DOUBLESPACE_QUALITY'
+
+MODES = ['off', 'flag', 'reject']
+
+QUALITY_REPORT = 'doublespace_quality.csv'
+
+# Longest side of the decode the scores are computed on
+SCORE_SIZE = 512
+
+# Levels at either end of the histogram that count as clipped
+CLIP_LEVELS = 3
+
+# Below this Laplacian variance a picture counts as blurry
+MIN_SHARPNESS = 40.0
+
+# Above this percentage of clipped pixels a picture counts as badly exposed
+MAX_CLIPPED_PERCENT = 5.0
+
+Score = namedtuple('Score', 'sharpness dark bright')
+
+
+def quality_mode(value=None):
+    ''' Return 'off', 'flag' or 'reject'; None reads DOUBLESPACE_QUALITY. '''
+    if value is None:
+        value = os.environ.get(QUALITY_ENV, '')
+    value = str(value).strip().lower() or 'off'
+    if value not in MODES:
+        raise ValueError("Unknown quality mode: " + value)
+    return value
+
+
+def problems(score):
+    ''' Return what is wrong with a picture of score, an empty list if nothing. '''
+    found = []
+    if score.sharpness < MIN_SHARPNESS:
+        found.append('blurry')
+    if score.dark > MAX_CLIPPED_PERCENT:
+        found.append('underexposed')
+    if score.bright > MAX_CLIPPED_PERCENT:
+        found.append('overexposed')
+    return found
+
+
+class QualityReport(object):
+    ''' Collects the scores of a run and appends them to the report in outputFolder. '''
+
+    def __init__(self, outputFolder, mode=None):
+        self.outputFolder = outputFolder
+        self.mode = quality_mode(mode)
+        self.rows = []
+
+    def add(self, source, score):
+        ''' Record the score of source; returns its problems. '''
+        found = problems(score)
+        verdict = 'ok'
+        if found:
+            verdict = 'rejected' if self.mode == 'reject' else 'flagged'
+        self.rows.append([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), source,
+                          '%.1f' % score.sharpness, '%.2f' % score.dark, '%.2f' % score.bright,
+                          ' '.join(found), verdict])
+        return found
+
+    def write(self):
+        if not self.rows:
+            return
+        path = os.path.join(self.outputFolder, QUALITY_REPORT)
+        new_file = not os.path.exists(path)
+        if sys.version_info[0] < 3:
+            f = open(path, 'ab')
+        else:
+            f = open(path, 'a', newline='')
+        with f:
+            report = csv.writer(f)
+            if new_file:
+                report.writerow(['date', 'source', 'sharpness', 'dark_percent', 'bright_percent',
+                                 'problems', 'verdict'])
+            report.writerows(self.rows)
+        self.rows = []
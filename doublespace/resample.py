@@ -0,0 +1,120 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Choice of resampling filter for resizing pictures.
+
+Modes are 'nearest', 'box', 'bilinear', 'bicubic' and 'lanczos'.  Two presets
+pick a mode and a reduction gap:
+
+    fast     bilinear, box reduce first down to 2x the final size (drafts)
+    quality  lanczos, box reduce first down to 3x the final size (prints)
+
+Downscaling by a large factor is done in two stages: a cheap integer box
+reduction, followed by the chosen filter over the last (reducing_gap) factor.
+When the source is an exact multiple of the target (1200 px to 600 or 300 px)
+the box reduction alone gives the result.
+
+The default is 'bicubic' without a reduction stage, which is what the plugins
+have always used.  DOUBLESPACE_RESAMPLE selects another mode or preset.
+
+This module only plans the steps; engine.resize and gimp_ops.scale_picture
+carry them out.
+'''
+
+import os
+
+RESAMPLE_ENV = 'DOUBLESPACE_RESAMPLE'
+
+MODES = ['nearest', 'box', 'bilinear', 'bicubic', 'lanczos']
+
+PRESETS = {
+    'fast': ('bilinear', 2.0),
+    'quality': ('lanczos', 3.0),
+}
+
+DEFAULT_MODE = 'bicubic'
+
+
+def resample_mode(name=None):
+    ''' Return (mode, reducing_gap) for a mode or preset name.
+
+    None reads DOUBLESPACE_RESAMPLE; an empty name gives the default.
+    reducing_gap is None when there is no box reduction stage.
+    Raises ValueError for unknown names.
+    '''
+    if name is None:
+        name = os.environ.get(RESAMPLE_ENV, '')
+    name = str(name).strip().lower()
+    if name == '':
+        return DEFAULT_MODE, None
+    if name in PRESETS:
+        return PRESETS[name]
+    if name in MODES:
+        return name, None
+    raise ValueError("Unknown resampling mode: " + name + " (use one of " + ", ".join(MODES + sorted(PRESETS)) + ")")
+
+
+def exact_factor(source_size, target_size):
+    ''' Return k if source_size is exactly k times target_size (k > 1), else None. '''
+    (source_width, source_height), (target_width, target_height) = source_size, target_size
+    if target_width <= 0 or target_height <= 0:
+        return None
+    if source_width % target_width or source_height % target_height:
+        return None
+    factor = source_width // target_width
+    if factor > 1 and factor == source_height // target_height:
+        return factor
+    return None
+
+
+def resample_steps(source_size, target_size, mode=DEFAULT_MODE, reducing_gap=None):
+    ''' Plan the resize of source_size to target_size.
+
+    Returns a list of steps, each ('reduce', k) for an integer box reduction
+    by k, or ('resize', (width, height), mode) for a filtered resize.
+    '''
+    source_size = tuple(source_size)
+    target_size = tuple(target_size)
+    if source_size == target_size:
+        return []
+
+    if mode != 'nearest':
+        factor = exact_factor(source_size, target_size)
+        if factor is not None:
+            return [('reduce', factor)]
+
+    steps = []
+    if reducing_gap is not None and mode != 'nearest':
+        factor = min(source_size[0] * 1.0 / target_size[0], source_size[1] * 1.0 / target_size[1])
+        reduce_by = int(factor / reducing_gap)
+        if reduce_by >= 2:
+            steps.append(('reduce', reduce_by))
+    steps.append(('resize', target_size, mode))
+    return steps
@@ -0,0 +1,86 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Bookkeeping around one layout run: profiling, metrics and scratch images. '''
+
+from doublespace import metrics
+from doublespace.profiling import profile_run
+
+
+class layout_run(object):
+    ''' Context manager around one run of a layout.
+
+    Parameters:
+    template : string Name of the layout, used in profile files and metric labels.
+    outputFolder : string The folder the run saves its sheets in.
+    profile : string Profiling mode, None to use the environment variable.
+    metrics_path : string Metrics snapshot file, None to use the environment variable.
+    scratch : Scratch Scratch images of the run (GIMP only), released at the end
+        and reported in the memory report.
+    '''
+
+    def __init__(self, template, outputFolder, profile=None, metrics_path=None, scratch=None):
+        self.template = template
+        self.outputFolder = outputFolder
+        self.metrics_path = metrics_path
+        self.scratch = scratch
+        self.profile = profile_run(template, outputFolder, profile)
+
+    def __enter__(self):
+        metrics.registry.reset(template=self.template)
+        if self.scratch is not None:
+            self.scratch.begin()
+        self.profile.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.__exit__(exc_type, exc_value, traceback)
+        if self.scratch is not None:
+            self.scratch.release_all()
+            self.scratch.write_report(self.outputFolder, self.template)
+        if exc_value is not None:
+            metrics.unexpected(exc_value)
+        metrics.write_snapshot(self.metrics_path)
+        return False
+
+
+def entry_point(function, template, output_arg=-1, scratch=None):
+    ''' Wrap a plugin layout function so that every call runs in a layout_run.
+
+    output_arg is the position of the output folder in the arguments of
+    function, the last one for all plugins.  scratch is the Scratch the
+    plugin creates its images through.
+    '''
+    def run(*args):
+        with layout_run(template, args[output_arg], scratch=scratch):
+            return function(*args)
+    run.__name__ = function.__name__
+    run.__doc__ = function.__doc__
+    return run
@@ -0,0 +1,137 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Scratch images of a plugin run, and a memory report per run.
+
+Only usable inside GIMP.  Every image a plugin creates for its own use goes
+through Scratch.image, which turns off its undo history and remembers it.
+Whatever is still open when the run ends (also after an error) is deleted,
+except for images handed to the user with Scratch.keep.
+
+After each run a line is added to doublespace_memory.csv in the output folder
+with the number of images open in GIMP and their approximate size, before and
+after the run.
+'''
+
+import os
+import csv
+import sys
+from datetime import datetime
+
+from gimpfu import gimp, pdb
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MEMORY_REPORT = 'doublespace_memory.csv'
+
+
+def image_bytes(image):
+    ''' Approximate memory used by the pixels of image. '''
+    total = 0
+    for layer in image.layers:
+        total = total + layer.width * layer.height * layer.bpp
+        if layer.mask is not None:
+            total = total + layer.width * layer.height
+    for channel in image.channels:
+        total = total + channel.width * channel.height
+    return total
+
+
+def open_images():
+    ''' Return (number of images open in GIMP, approximate bytes). '''
+    images = gimp.image_list()
+    return len(images), sum(image_bytes(image) for image in images)
+
+
+def peak_rss():
+    ''' Peak memory of this plugin process in bytes, or None if unknown. '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform != 'darwin':
+        peak = peak * 1024
+    return peak
+
+
+class Scratch(object):
+    ''' The scratch images of one plugin run. '''
+
+    def __init__(self):
+        self.images = []
+        self.before = None
+
+    def image(self, image):
+        ''' Track image as scratch and turn off its undo history. '''
+        pdb.gimp_image_undo_disable(image)
+        self.images.append(image)
+        return image
+
+    def keep(self, image):
+        ''' Hand image over to the user: it is not deleted and gets its undo history back. '''
+        if image in self.images:
+            self.images.remove(image)
+        pdb.gimp_image_undo_enable(image)
+        return image
+
+    def release(self, image):
+        ''' Delete one scratch image now. '''
+        if image in self.images:
+            self.images.remove(image)
+        if pdb.gimp_image_is_valid(image):
+            pdb.gimp_image_delete(image)
+
+    def begin(self):
+        self.before = open_images()
+
+    def release_all(self):
+        for image in list(self.images):
+            self.release(image)
+
+    def write_report(self, outputFolder, template):
+        ''' Append the memory figures of this run to the report in outputFolder. '''
+        after = open_images()
+        before = self.before or after
+        path = os.path.join(outputFolder, MEMORY_REPORT)
+        new_file = not os.path.exists(path)
+        if sys.version_info[0] < 3:
+            f = open(path, 'ab')
+        else:
+            f = open(path, 'a', newline='')
+        with f:
+            report = csv.writer(f)
+            if new_file:
+                report.writerow(['date', 'template', 'images_before', 'images_after',
+                                 'image_bytes_before', 'image_bytes_after', 'plugin_peak_rss'])
+            report.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), template,
+                             before[0], after[0], before[1], after[1], peak_rss() or ''])
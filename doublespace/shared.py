@@ -0,0 +1,150 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Sheets in shared memory for encoder processes.
+
+With encoder processes (the encoders parameter or DOUBLESPACE_ENCODERS, default
+0 for none) the batch engine composes sheets into canvasses that live in
+memory-mapped scratch files, in /dev/shm where there is one.  An encoder is
+sent the file's path and the sheet size, maps the same memory and encodes the
+sheet from it, so the pixels are never copied or pickled between processes;
+only the encoded JPEG comes back.  The encoder unmaps the sheet before it
+returns, so once the JPEG is back no other process holds the canvass, and it
+can be reused or discarded and its memory given back to the budget.
+
+Mapped canvasses are RGBX, which the JPEG encoder saves exactly like RGB.
+'''
+
+import mmap
+import os
+import signal
+import tempfile
+
+from PIL import Image
+
+from doublespace import engine
+
+ENCODERS_ENV = 'DOUBLESPACE_ENCODERS'
+
+# Where the scratch files go; /dev/shm is memory, not disk
+SCRATCH_FOLDER = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def encoder_count(encoders=None):
+    if encoders is None:
+        encoders = os.environ.get(ENCODERS_ENV, '').strip() or 0
+    return max(0, int(encoders))
+
+
+def _map_image(memory, size):
+    image = Image.frombuffer('RGBX', size, memory, 'raw', 'RGBX', 0, 1)
+    # Draw straight into the mapped memory instead of a private copy
+    image.readonly = 0
+    return image
+
+
+def _unmap(memory):
+    try:
+        memory.close()
+    except BufferError:
+        # An image still uses it; the mapping goes when that image does
+        pass
+
+
+class SharedCanvass(object):
+    ''' A white sheet of size (width, height) in a memory-mapped scratch file. '''
+
+    def __init__(self, width, height):
+        self.size = (width, height)
+        fd, self.path = tempfile.mkstemp(prefix='doublespace_', suffix='.canvass', dir=SCRATCH_FOLDER)
+        try:
+            os.ftruncate(fd, engine.image_bytes(width, height))
+            self.memory = mmap.mmap(fd, engine.image_bytes(width, height))
+        finally:
+            os.close(fd)
+        self.image = _map_image(self.memory, self.size)
+        engine.clear_canvass(self.image)
+
+    def handle(self):
+        ''' What an encoder needs to find the sheet. '''
+        return self.path, self.size
+
+    def close(self):
+        self.image = None
+        _unmap(self.memory)
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Still mapped (Windows); the temporary folder is cleaned up later
+            pass
+
+
+def encode_shared(handle, quality=engine.JPEG_QUALITY, dpi=None, max_bytes=None):
+    ''' Encode the shared sheet of handle; runs in an encoder process.
+    Returns (data, quality), see engine.encode_to_size.  The sheet is
+    unmapped again before this returns.
+    '''
+    path, size = handle
+    with open(path, 'r+b') as f:
+        memory = mmap.mmap(f.fileno(), engine.image_bytes(*size))
+    image = _map_image(memory, size)
+    try:
+        return engine.encode_to_size(image, max_bytes, quality, dpi)
+    finally:
+        # The image holds the mapping; it has to go first
+        image = None
+        memory.close()
+
+
+def _ignore_interrupts():
+    # Ctrl+C reaches the whole process group; the run decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class SheetEncoder(object):
+    ''' Encodes shared sheets on processes encoder processes. '''
+
+    def __init__(self, processes):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.processes = processes
+        # Encoders forked from this process would inherit the mappings of the
+        # canvasses it has at the time, and keep them after they are discarded
+        context = None
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        self.executor = ProcessPoolExecutor(processes, mp_context=context, initializer=_ignore_interrupts)
+
+    def submit(self, canvass, quality=engine.JPEG_QUALITY, dpi=None, max_bytes=None):
+        ''' Start encoding the SharedCanvass; returns a future of (JPEG, quality). '''
+        return self.executor.submit(encode_shared, canvass.handle(), quality, dpi, max_bytes)
+
+    def close(self):
+        self.executor.shutdown()
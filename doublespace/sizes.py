@@ -0,0 +1,165 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Paper and picture sizes shared by the layouts.
+
+Papers, pictures and the gaps between copies are defined in inches.  Pixel
+sizes are derived for the resolution a sheet is rendered at: DOUBLESPACE_DPI
+or the dpi arguments, 300 dpi by default.  At 300 dpi they are the pixel
+values the plugins have always used (a 4R sheet is 1200 x 1800 pixels); 600 dpi
+gives sheets of the same print size with twice the detail.
+'''
+
+import os
+
+DPI_ENV = 'DOUBLESPACE_DPI'
+
+# Resolution the pixel tables below are for, and the default for sheets
+BASE_DPI = 300
+
+# Option lists in the order the plugins show them in their dialogs
+PAPERS = ['4R', '5R', 'A4', 'Letter']
+PICTURES = ['1 x 1', '1.5 x 1.5', '2 x 2', 'PH Passport', '2R']
+
+# (width, height) in inches
+paper_inches = {'4R': (4, 6), '5R': (5, 7), 'A4': (8.27, 11.69), 'Letter': (8.5, 11)}
+picture_inches = {'1 x 1': (1, 1), '1.5 x 1.5': (1.5, 1.5), '2 x 2': (2, 2),
+                  'PH Passport': (1.37, 1.77), '2R': (3.5, 2.5)}
+
+# Gap between two copies, and the extra margin before the first copy
+gutter_inches = 1 / 6.0
+margin_inches = 1 / 6.0
+
+# Gaps between the 2 x 2 copies and between the 1 x 1 copies in a row of the
+# 5R 2 x 2 + 1 x 1 layout
+gutter_2x2_inches = 0.25
+gutter_1x1_inches = 1 / 12.0
+
+
+def sheet_dpi(dpi=None):
+    ''' Return the resolution to render sheets at. '''
+    if dpi is None:
+        dpi = os.environ.get(DPI_ENV, '').strip() or BASE_DPI
+    dpi = int(dpi)
+    if dpi <= 0:
+        raise ValueError("Resolution must be positive: " + str(dpi))
+    return dpi
+
+
+def to_pixels(inches, dpi=BASE_DPI):
+    return int(round(inches * dpi))
+
+
+def paper_pixels(paper, dpi=BASE_DPI):
+    ''' Return (width, height) of paper in pixels at dpi. '''
+    width, height = paper_inches[paper_name(paper)]
+    return to_pixels(width, dpi), to_pixels(height, dpi)
+
+
+def picture_pixels(picture, dpi=BASE_DPI):
+    ''' Return (width, height) of picture in pixels at dpi. '''
+    width, height = picture_inches[picture_name(picture)]
+    return to_pixels(width, dpi), to_pixels(height, dpi)
+
+
+def gutter_pixels(dpi=BASE_DPI):
+    ''' Gap between two copies in pixels at dpi. '''
+    return to_pixels(gutter_inches, dpi)
+
+
+def margin_pixels(dpi=BASE_DPI):
+    ''' Extra margin before the first copy in pixels at dpi. '''
+    return to_pixels(margin_inches, dpi)
+
+
+def gutter_2x2_pixels(dpi=BASE_DPI):
+    ''' Gap between two 2 x 2 copies of the 5R layout in pixels at dpi. '''
+    return to_pixels(gutter_2x2_inches, dpi)
+
+
+def gutter_1x1_pixels(dpi=BASE_DPI):
+    ''' Gap between two 1 x 1 copies of the 5R layout in pixels at dpi. '''
+    return to_pixels(gutter_1x1_inches, dpi)
+
+
+def _pixel_table(inches, dpi):
+    return dict((name, {'width': to_pixels(width, dpi), 'height': to_pixels(height, dpi)})
+                for name, (width, height) in inches.items())
+
+
+def paper_table(dpi=BASE_DPI):
+    ''' Return {paper: {'width': .., 'height': ..}} in pixels at dpi. '''
+    return _pixel_table(paper_inches, dpi)
+
+
+def picture_table(dpi=BASE_DPI):
+    ''' Return {picture: {'width': .., 'height': ..}} in pixels at dpi. '''
+    return _pixel_table(picture_inches, dpi)
+
+
+# Sizes in pixels at BASE_DPI
+paper_sizes = paper_table()
+picture_sizes = picture_table()
+
+# Resolution written into sheets rendered at BASE_DPI
+img_resolution_x = BASE_DPI
+img_resolution_y = BASE_DPI
+
+# Smallest accepted source for the square ID sizes (a 2x2 picture), in source pixels
+min_source_size = 600
+
+# Gap between two copies on the sheet, in pixels at BASE_DPI
+copy_interval = gutter_pixels()
+
+
+def _key(name):
+    return name.replace(' ', '').lower()
+
+
+def paper_name(name):
+    ''' Return the canonical paper name for name ("a4" -> "A4").
+
+    Raises ValueError for unknown papers.
+    '''
+    for paper in PAPERS:
+        if _key(paper) == _key(name):
+            return paper
+    raise ValueError("Unknown paper size: " + str(name))
+
+
+def picture_name(name):
+    ''' Return the canonical picture name for name ("1x1" -> "1 x 1").
+
+    Raises ValueError for unknown pictures.
+    '''
+    for picture in PICTURES:
+        if _key(picture) == _key(name):
+            return picture
+    raise ValueError("Unknown picture size: " + str(name))
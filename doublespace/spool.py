@@ -0,0 +1,276 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2015, Edwin T. Tumbaga
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#    - Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#    - Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation and/or
+#    other materials provided with the distribution.
+#    - Neither the name of the author nor the names of its contributors may be used
+#    to endorse or promote products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE.
+
+
+''' Streaming sheets straight to a print spool.
+
+Instead of saving sheets in the output folder for the print workflow to read
+back, the batch engine can hand every encoded sheet to a spool target, set by
+the spool parameter or DOUBLESPACE_SPOOL:
+
+    pipe:PATH     write the sheets one after another into a named pipe
+    dir:PATH      drop every sheet into a spool folder (a hot folder); the
+                  printer removes a job when it has printed it
+    command:CMD   run CMD for every sheet with the sheet on its standard input,
+                  e.g. "command:lp -d photo"; {name} in CMD is the sheet's name
+
+When the printer falls behind, sending waits: a pipe blocks once the reader
+stops reading, a command is waited for, and at most jobs sheets (default 4)
+wait in a spool folder.  LocalPrinter stands in for a printer when testing, see
+python -m doublespace printer.
+'''
+
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+from doublespace.output import replace
+
+SPOOL_ENV = 'DOUBLESPACE_SPOOL'
+
+KINDS = ['pipe', 'dir', 'command']
+
+# Sheets that may wait for the printer before sending waits
+DEFAULT_JOBS = 4
+
+# Seconds between looks at a spool folder
+POLL_INTERVAL = 0.1
+
+# Sheets a LocalPrinter prints per minute
+DEFAULT_PAGES_PER_MINUTE = 20
+
+JPEG_END = b'\xff\xd9'
+
+
+class SpoolError(IOError):
+    pass
+
+
+def spool_target(target=None):
+    ''' Return (kind, where) of the spool target, or None to save sheets. '''
+    if target is None:
+        target = os.environ.get(SPOOL_ENV, '')
+    target = str(target).strip()
+    if not target:
+        return None
+    kind, separator, where = target.partition(':')
+    kind = kind.strip().lower()
+    if not separator or kind not in KINDS or not where.strip():
+        raise ValueError("Unknown spool target: " + target + " (use pipe:PATH, dir:PATH or command:CMD)")
+    return kind, where.strip()
+
+
+def spool_sink(target=None, jobs=None):
+    ''' Return the sink for the spool target (see spool_target), or None. '''
+    target = spool_target(target)
+    if target is None:
+        return None
+    kind, where = target
+    if kind == 'pipe':
+        return PipeSpool(where)
+    if kind == 'dir':
+        return DirectorySpool(where, jobs)
+    return CommandSpool(where)
+
+
+def _is_job(name):
+    return not name.startswith('.') and not name.endswith('.part')
+
+
+def spooled_jobs(folder):
+    ''' Return the paths of the jobs waiting in a spool folder, oldest first. '''
+    paths = [os.path.join(folder, name) for name in os.listdir(folder) if _is_job(name)]
+    return sorted((path for path in paths if os.path.isfile(path)),
+                  key=lambda path: (os.path.getmtime(path), path))
+
+
+class PipeSpool(object):
+    ''' Writes sheets into the named pipe at path, opened with the first sheet. '''
+
+    def __init__(self, path):
+        self.path = path
+        self.pipe = None
+
+    def __repr__(self):
+        return "pipe:" + self.path
+
+    def send(self, data, name):
+        if self.pipe is None:
+            # Waits for a reader
+            self.pipe = open(self.path, 'wb')
+        self.pipe.write(data)
+        self.pipe.flush()
+
+    def close(self):
+        if self.pipe is not None:
+            self.pipe.close()
+            self.pipe = None
+
+
+class DirectorySpool(object):
+    ''' Drops sheets into the spool folder, and waits while jobs sheets are
+    still waiting there.
+    '''
+
+    def __init__(self, folder, jobs=None):
+        self.folder = folder
+        self.jobs = max(1, int(jobs or DEFAULT_JOBS))
+        self.waits = 0
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    def __repr__(self):
+        return "dir:" + self.folder
+
+    def send(self, data, name):
+        if len(spooled_jobs(self.folder)) >= self.jobs:
+            self.waits = self.waits + 1
+            while len(spooled_jobs(self.folder)) >= self.jobs:
+                time.sleep(POLL_INTERVAL)
+        path = os.path.join(self.folder, name)
+        # The printer only sees complete sheets
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        replace(path + '.part', path)
+
+    def close(self):
+        pass
+
+
+class CommandSpool(object):
+    ''' Runs command for every sheet and waits for it, so a command that
+    prints as it reads holds the run back to the printer's pace.
+    '''
+
+    def __init__(self, command):
+        self.command = command
+
+    def __repr__(self):
+        return "command:" + self.command
+
+    def send(self, data, name):
+        args = [arg.replace('{name}', name) for arg in shlex.split(self.command, posix=os.name != 'nt')]
+        process = subprocess.Popen(args, stdin=subprocess.PIPE)
+        try:
+            # Blocks while the command is not reading
+            process.stdin.write(data)
+            process.stdin.close()
+        except (IOError, OSError) as err:
+            process.wait()
+            raise SpoolError("Spool command stopped reading " + name + ": " + str(err))
+        if process.wait() != 0:
+            raise SpoolError("Spool command failed for %s (exit code %d)" % (name, process.returncode))
+
+    def close(self):
+        pass
+
+
+class LocalPrinter(object):
+    ''' Stand-in for a printer: takes sheets from a spool folder, a named pipe
+    or a stream at pages_per_minute, and moves them to keep (or throws them away).
+
+    Parameters:
+    source : string Spool folder, named pipe or file; '-' reads standard input.
+    pages_per_minute : float How fast sheets are printed.
+    keep : string Folder for the printed sheets; None throws them away.
+    log : function Called with a message for every printed sheet.
+    '''
+
+    def __init__(self, source, pages_per_minute=None, keep=None, log=None):
+        self.source = source
+        self.seconds_per_page = 60.0 / float(pages_per_minute or DEFAULT_PAGES_PER_MINUTE)
+        self.keep = keep
+        self.log = log or (lambda message: None)
+        self.printed = 0
+        if keep and not os.path.isdir(keep):
+            os.makedirs(keep)
+
+    def print_sheet(self, data, name):
+        time.sleep(self.seconds_per_page)
+        if self.keep:
+            with open(os.path.join(self.keep, name), 'wb') as f:
+                f.write(data)
+        self.printed = self.printed + 1
+        self.log("Printed " + name)
+
+    def run(self, idle=None):
+        ''' Print until the stream ends, or until the spool folder stayed
+        empty for idle seconds (None: until interrupted).  Returns the number
+        of printed sheets.
+        '''
+        if self.source != '-' and not os.path.exists(self.source):
+            os.makedirs(self.source)
+        if os.path.isdir(self.source):
+            self.run_folder(idle)
+        else:
+            self.run_stream()
+        return self.printed
+
+    def run_folder(self, idle=None):
+        empty_since = time.time()
+        while True:
+            jobs = spooled_jobs(self.source)
+            if not jobs:
+                if idle is not None and time.time() - empty_since >= idle:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            path = jobs[0]
+            with open(path, 'rb') as f:
+                data = f.read()
+            # The job leaves the queue once it is printed
+            self.print_sheet(data, os.path.basename(path))
+            os.remove(path)
+            empty_since = time.time()
+
+    def run_stream(self):
+        ''' Split the stream into sheets at the JPEG end markers; these only
+        occur there in the sheets the engine encodes.
+        '''
+        if self.source == '-':
+            stream = getattr(sys.stdin, 'buffer', sys.stdin)
+        else:
+            stream = open(self.source, 'rb')
+        data = b''
+        try:
+            while True:
+                block = stream.read(1 << 16)
+                data = data + block
+                end = data.find(JPEG_END)
+                while end >= 0:
+                    self.print_sheet(data[:end + 2], "sheet_%04d.jpg" % (self.printed + 1))
+                    data = data[end + 2:]
+                    end = data.find(JPEG_END)
+                if not block:
+                    return
+        finally:
+            if stream is not getattr(sys.stdin, 'buffer', sys.stdin):
+                stream.close()
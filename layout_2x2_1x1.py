@@ -33,6 +33,16 @@ import sys
 import copy
 from gimpfu import *
 from datetime import datetime
+from doublespace import metrics
+from doublespace import sizes
+from doublespace.gimp_ops import convert_for_printer, copy_picture, enhance_picture, frozen, place_picture, quality_gate, save_jpeg, save_outputs, scale_picture
+from doublespace.naming import SheetNamer
+from doublespace.output import SheetWriter
+from doublespace.runs import entry_point
+from doublespace.scratch import Scratch
+
+# Images the plugin makes for its own use, deleted when a run ends
+scratch = Scratch()
 
 def layout(img, layer, outputFolder):
     ''' Make 2x2 and 1x1 copies of a square ID picture.
@@ -43,110 +53,132 @@ def layout(img, layer, outputFolder):
     outputFolder : string The folder in which save the modified images.
     '''
     
-    # Generate filename
-    prefix = "doublespace_image"
-    extension = ".jpg"
-    filedate = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file = prefix + "_" + filedate + extension
+    # Generate filename, unique per run and sheet
+    namer = SheetNamer(outputFolder)
+    writer = SheetWriter()
+    file = os.path.basename(namer.next_path())
     
     # Get original image height and width
     img_height = pdb.gimp_image_height(img)
     img_width = pdb.gimp_image_width(img)
+    metrics.image_read()
     
     # If image is not up to spec, return an error message.
     # Image must be a perfect square
     # Image should be at least 600x600 pixels (for a 2x2 picture)
     if img_height != img_width:
         gimp.message("Image is not a perfect square!")
+        metrics.failure('aspect')
         return
-    elif img_height < 600:
+    elif img_height < sizes.min_source_size:
         gimp.message("Minimum size should be 600 X 600 pixels (or 2 inches)")
+        metrics.failure('aspect')
         return
 
     #Some variables used throughout
     RGB = 0
-    canvass_width = 1200
-    canvass_height = 1800
-    copy_width_1x1 = 300
-    copy_height_1x1 = 300
-    copy_width_2x2 = 600
-    copy_height_2x2 = 600
-    current_position_x = 100
-    current_position_y = 100
+    # Sheets are rendered at DOUBLESPACE_DPI, 300 dpi by default
+    dpi = sizes.sheet_dpi()
+    canvass_width, canvass_height = sizes.paper_pixels('4R', dpi)
+    copy_width_1x1, copy_height_1x1 = sizes.picture_pixels('1 x 1', dpi)
+    copy_width_2x2, copy_height_2x2 = sizes.picture_pixels('2 x 2', dpi)
+    copy_interval = sizes.gutter_pixels(dpi)
+    margin = 2 * copy_interval
+    current_position_x = margin
+    current_position_y = margin
 
     try:
+        # Check sharpness and exposure first if DOUBLESPACE_QUALITY is set
+        if not quality_gate(img, outputFolder):
+            return
+
         # Create output path and filename
         outputPath = outputFolder + "\\" + file
+        # Save to a temporary file; the sheet gets its name once it is complete
+        tempPath = writer.temp_path(outputPath)
         
         # Make copies of the original image.
         # This is so that the original image remains unmodified all throughout the processing
-        img2x2 = copy_orig_picture(img,layer)
-        img1x1 = copy_orig_picture(img,layer)
+        with metrics.stage('copy'):
+            img2x2 = copy_orig_picture(img,layer)
+            img1x1 = copy_orig_picture(img,layer)
         
         # PROCESS image sizes
-        img2x2 = resize_picture(img2x2,copy_width_2x2, copy_height_2x2)
-        img1x1 = resize_picture(img1x1,copy_width_1x1, copy_height_1x1)
+        with metrics.stage('resize'):
+            img2x2 = resize_picture(img2x2,copy_width_2x2, copy_height_2x2)
+            img1x1 = resize_picture(img1x1,copy_width_1x1, copy_height_1x1)
+        # Optional sharpening and tone correction, see doublespace/enhance.py
+        enhance_picture(img2x2)
+        enhance_picture(img1x1)
+        # Printer colors if DOUBLESPACE_PRINTER_PROFILE is set; the paper stays white
+        convert_for_printer(img2x2)
+        convert_for_printer(img1x1)
         
         # Make the picture canvass. This is where we will do all the dirty work.
         canvass = None
-        canvass = pdb.gimp_image_new(canvass_width,canvass_height,RGB)
+        canvass = scratch.image(pdb.gimp_image_new(canvass_width,canvass_height,RGB))
         
         #Create duplicates of the processed (resized) images
-        layer = duplicate_picture(img2x2,canvass,current_position_x, current_position_y,copy_width_2x2,copy_height_2x2,"2x2 1st copy")    
-        current_position_y = current_position_y + pdb.gimp_drawable_height(layer) + 50
+        with metrics.stage('compose'), frozen(canvass):
+            layer = duplicate_picture(img2x2,canvass,current_position_x, current_position_y,copy_width_2x2,copy_height_2x2,"2x2 1st copy")    
+            current_position_y = current_position_y + copy_height_2x2 + copy_interval
 
-        layer = duplicate_picture(img2x2,canvass,current_position_x, current_position_y,copy_width_2x2,copy_height_2x2,"2x2 2nd copy")
-        current_position_y = current_position_y + pdb.gimp_drawable_height(layer) + 50
+            layer = duplicate_picture(img2x2,canvass,current_position_x, current_position_y,copy_width_2x2,copy_height_2x2,"2x2 2nd copy")
+            current_position_y = current_position_y + copy_height_2x2 + copy_interval
         
         
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 1st copy")
-        current_position_x = current_position_x + pdb.gimp_drawable_width(layer) + 50
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 1st copy")
+            current_position_x = current_position_x + copy_width_1x1 + copy_interval
 
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 2nd copy")
-        current_position_x = current_position_x + pdb.gimp_drawable_width(layer) + 50
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 2nd copy")
+            current_position_x = current_position_x + copy_width_1x1 + copy_interval
         
-        current_position_y = 100
+            current_position_y = margin
         
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 3rd copy")
-        current_position_y = current_position_y + pdb.gimp_drawable_height(layer) + 100
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 3rd copy")
+            current_position_y = current_position_y + copy_height_1x1 + 2 * copy_interval
         
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 4th copy")
-        current_position_y = current_position_y + pdb.gimp_drawable_height(layer) + 100
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 4th copy")
+            current_position_y = current_position_y + copy_height_1x1 + 2 * copy_interval
         
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 5th copy")
-        current_position_y = current_position_y + pdb.gimp_drawable_height(layer) + 100
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 5th copy")
+            current_position_y = current_position_y + copy_height_1x1 + 2 * copy_interval
         
-        layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 6th copy")
+            layer = duplicate_picture(img1x1,canvass,current_position_x, current_position_y,copy_width_1x1,copy_height_1x1,"1x1 6th copy")
         
         pdb.gimp_image_flatten(canvass)
-        pdb.gimp_image_set_resolution(canvass, 600, 600)
+        pdb.gimp_image_set_resolution(canvass, dpi, dpi)
         
         
-        if(file.lower().endswith(('.png'))):
-            pdb.file_png_save(canvass, canvass.layers[0], outputPath, outputPath, 0, 9, 0, 0, 0, 0, 0)
+        with metrics.stage('encode', failure='encode'):
+            if(file.lower().endswith(('.png'))):
+                pdb.file_png_save(canvass, canvass.layers[0], tempPath, tempPath, 0, 9, 0, 0, 0, 0, 0)
             
-        if(file.lower().endswith(('.jpeg', '.jpg'))):
-            pdb.file_jpeg_save(canvass, canvass.layers[0], outputPath, outputPath, 0.9, 0, 0, 0, "Creating with GIMP", 0, 0, 0, 0)
+            if(file.lower().endswith(('.jpeg', '.jpg'))):
+                save_jpeg(canvass, tempPath)
+        outputPath = writer.publish(tempPath, namer.final_path(outputPath, tempPath))
+        metrics.sheet_written(outputPath)
+        # Lower resolutions if DOUBLESPACE_OUTPUTS is set
+        save_outputs(canvass, outputPath, writer, dpi)
         
         #Display resulting image
-        display = pdb.gimp_display_new(canvass)
+        display = pdb.gimp_display_new(scratch.keep(canvass))
 
 
         #gimp.message("Success!")
     except Exception as err:
+        metrics.unexpected(err)
         gimp.message("Unexpected error: " + str(err))
 
+    writer.close()
+
 # Function to copy the original image
 def copy_orig_picture(image, layer):
     img_width = pdb.gimp_image_width(image)
     img_height = pdb.gimp_image_height(image)
-    image_copy = pdb.gimp_image_new(img_width,img_height, 0)
-    layer_copy = pdb.gimp_layer_new(image_copy,img_width,img_height,0,"default",100,0)
-    
-    pdb.gimp_image_add_layer(image_copy,layer_copy, -1)
-    pdb.gimp_edit_copy(layer)
-    selection = pdb.gimp_edit_paste(layer_copy,-1)
-    pdb.gimp_floating_sel_anchor(selection)
+    image_copy = scratch.image(pdb.gimp_image_new(img_width,img_height, 0))
+    # The layer is copied directly, not through the clipboard
+    copy_picture(layer, image_copy)
     
     #display = pdb.gimp_display_new(image_copy)
     
@@ -154,18 +186,14 @@ def copy_orig_picture(image, layer):
     
 # Function to resize the original image to the appropriate width / height (2x2 or 1x1)    
 def resize_picture(orig_image, new_width, new_height):
-    resized = pdb.gimp_image_scale(orig_image, new_width, new_height)
+    resized = scale_picture(orig_image, new_width, new_height)
     return orig_image
 
 # Function to make additional copies of the resized images    
 def duplicate_picture(orig_image, canvass_image, xpos, ypos,img_width, img_height, name):
-    layer = pdb.gimp_layer_new(canvass_image,img_width,img_height,0,name,100,0)
-    pdb.gimp_image_add_layer(canvass_image,layer,-1)
-    pdb.gimp_selection_all(orig_image)
-    pdb.gimp_edit_copy(orig_image.layers[0])
-    selection = pdb.gimp_edit_paste(layer,-1)
-    pdb.gimp_floating_sel_anchor(selection)
-    pdb.gimp_layer_set_offsets(layer,xpos,ypos)
+    # The layer is copied directly, not through the clipboard
+    layer = place_picture(orig_image.layers[0], canvass_image, xpos, ypos, img_width, img_height)
+    pdb.gimp_item_set_name(layer, name)
     return layer
     
 from os.path import expanduser
@@ -189,6 +217,6 @@ register(
         #(PF_SLIDER, "blackPct", "Percentage of dark" , 0.2, (0.0,1.0,0.01))
     ],
     [],
-    layout)
+    entry_point(layout, "2x2_1x1", scratch=scratch))
 
 main()
@@ -33,6 +33,19 @@ import sys
 import copy
 from gimpfu import *
 from datetime import datetime
+from doublespace import metrics
+from doublespace import sizes
+from doublespace.gimp_ops import convert_for_printer, copy_picture, enhance_picture, place_picture, quality_gate, save_jpeg, save_outputs, scale_picture, show_progress
+from doublespace.naming import SheetNamer
+from doublespace.output import SheetWriter
+from doublespace.pool import CanvassPool
+from doublespace.prefetch import Prefetcher, read_ahead
+from doublespace.progress import Progress
+from doublespace.runs import entry_point
+from doublespace.scratch import Scratch
+
+# Images the plugin makes for its own use, deleted when a run ends
+scratch = Scratch()
 
 def layout(img, layer, paper_size, inputFolder, outputFolder):
     ''' Make multiple page layouts  of different pictures loaded from a directory.
@@ -61,14 +74,14 @@ def layout(img, layer, paper_size, inputFolder, outputFolder):
     
     
    
-    paper_sizes = {'4R':{'width':1200,'height':1800},'5R':{'width':1500,'height':2100},'A4':{'width':2481,'height':3507}}
-    picture_sizes = {'1 x 1':{'width':300,'height':300}, '1.5 x 1.5':{'width':450,'height':450}, '2 x 2':{'width':600,'height':600},'PH Passport':{'width':411,'height':531},'2R':{'width':1050,'height':750}}
     
     
     #img_resolution_x = picture_sizes[picture_size]['width']
     #img_resolution_y = picture_sizes[picture_size]['height']
-    img_resolution_x = 600
-    img_resolution_y = 600
+    # Sheets are rendered at DOUBLESPACE_DPI, 300 dpi by default
+    dpi = sizes.sheet_dpi()
+    img_resolution_x = dpi
+    img_resolution_y = dpi
     
     # If image is not up to spec, return an error message.
     # Image must be a perfect square
@@ -92,22 +105,31 @@ def layout(img, layer, paper_size, inputFolder, outputFolder):
     
     #Some variables used throughout
     RGB = 0
-    canvass_width = paper_sizes[paper_size]['width']
-    canvass_height = paper_sizes[paper_size]['height']
-    copy_width = 1050
-    copy_height = 750
-    copy_interval = 50
-    current_position_x = copy_interval + 50
-    current_position_y = copy_interval + 50
+    canvass_width, canvass_height = sizes.paper_pixels(paper_size, dpi)
+    copy_width, copy_height = sizes.picture_pixels('2R', dpi)
+    copy_interval = sizes.gutter_pixels(dpi)
+    current_position_x = copy_interval + sizes.margin_pixels(dpi)
+    current_position_y = copy_interval + sizes.margin_pixels(dpi)
     
     files = sorted(os.listdir(inputFolder))
     file_count = len(files)
-    last_file = False
     canvass_full = True
-    for file in files :
-        gimp.message("File: "+str(file))
-        if files.index(file) + 1 == file_count:
-            last_file = True
+    namer = SheetNamer(outputFolder)
+    writer = SheetWriter()
+    # Progress bar instead of a message per step; a doublespace.stop file in
+    # the output folder stops the run after the current sheet
+    gimp.progress_init("Laying out " + str(file_count) + " files")
+    progress = Progress(show_progress, outputFolder)
+    progress.start(file_count)
+    # Blank canvasses are reused between sheets instead of making a new image per sheet
+    canvass_pool = CanvassPool(new_canvass, clear_canvass, scratch.release)
+    # The next files are read from disk on background threads while the current one is laid out.
+    # Only the reading is done ahead: pdb calls must stay on this thread.
+    for file, readahead in Prefetcher(files, lambda file: prefetch_file(inputFolder + "\\" + file)) :
+        if progress.cancelled:
+            gimp.message("Cancelled after " + str(progress.pictures) + " of " + str(file_count) + " files")
+            break
+        sheets = file_counter
             
         try:
             # Build the full file paths.
@@ -116,14 +138,21 @@ def layout(img, layer, paper_size, inputFolder, outputFolder):
                         
             # Open the file if is a JPEG or PNG image.
             image = None
-            if(file.lower().endswith(('.png'))):
-                image = pdb.file_png_load(inputPath, inputPath)
-            if(file.lower().endswith(('.jpeg', '.jpg'))):
-                image = pdb.file_jpeg_load(inputPath, inputPath)
+            with metrics.stage('load', failure='unreadable'):
+                if(file.lower().endswith(('.png'))):
+                    image = pdb.file_png_load(inputPath, inputPath)
+                if(file.lower().endswith(('.jpeg', '.jpg'))):
+                    image = pdb.file_jpeg_load(inputPath, inputPath)
                 
                 
             # Verify if the file is an image.
             if(image != None):
+                scratch.image(image)
+                metrics.image_read()
+                # Skip blurry or badly exposed pictures if DOUBLESPACE_QUALITY=reject
+                if not quality_gate(image, outputFolder, inputPath):
+                    scratch.release(image)
+                    continue
                 # Invert the image.
                 if(len(image.layers) > 0):
                     #layer = image.layers[0]
@@ -149,12 +178,10 @@ def layout(img, layer, paper_size, inputFolder, outputFolder):
                     # Image should be at least 600x600 pixels (for a 2x2 picture)
                     if img_height > img_width:
                         img_orientation = 'portrait'        
-                        gimp.message("Image is Portrait")
                         #return
                     
                     if img_height < img_width:
                         img_orientation = 'landscape'
-                        gimp.message("Image is Landscape")
                         #return
                         
                     if img_orientation == 'portrait':
@@ -164,88 +191,103 @@ def layout(img, layer, paper_size, inputFolder, outputFolder):
                         #gimp.message("Image Width:"+str(img_width))
                         #gimp.message("Image Height:"+str(img_height))
                     # PROCESS image sizes
-                    img_copy = resize_picture(img_copy,copy_width, copy_height)
+                    with metrics.stage('resize'):
+                        img_copy = resize_picture(img_copy,copy_width, copy_height)
+                    # Optional sharpening and tone correction, see doublespace/enhance.py
+                    enhance_picture(img_copy)
+                    # Printer colors if DOUBLESPACE_PRINTER_PROFILE is set; the paper stays white
+                    convert_for_printer(img_copy)
                     
                     # Make the picture canvass. This is where we will do all the dirty work.
                     
                     # If canvass is full, create a new canvass
                     if canvass_full:
                         #gimp.message("Reached maximum number of drawings!")
-                        canvass = None
-                        canvass = pdb.gimp_image_new(canvass_width,canvass_height,RGB)
+                        canvass = canvass_pool.acquire(canvass_width,canvass_height)
                         canvass_full = False
                         #display = pdb.gimp_display_new(canvass)
-                        gimp.message("File counter:" + str(file_counter))
                     
                     #Create duplicates of the processed (resized) images
                     
-                    gimp.message("Duplicate picture")
-                    layer = duplicate_picture(img_copy,canvass,current_position_x, current_position_y,copy_width,copy_height,"duplicate")
-                    current_position_x = current_position_x + pdb.gimp_drawable_width(layer) + copy_interval
+                    with metrics.stage('compose'):
+                        layer = duplicate_picture(img_copy,canvass,current_position_x, current_position_y,copy_width,copy_height,"duplicate")
+                    current_position_x = current_position_x + copy_width + copy_interval
 
-                    gimp.message("Set next position")
                     if current_position_x > canvass_width - (copy_width + copy_interval):
-                        current_position_x = copy_interval + 50
+                        current_position_x = copy_interval + sizes.margin_pixels(dpi)
                         current_position_y = current_position_y + copy_height + copy_interval
                     
-                        if (current_position_y > canvass_height - (copy_height + copy_interval)) or last_file:
-                            gimp.message("Reached maximum number of drawings!")
+                        if current_position_y > canvass_height - (copy_height + copy_interval):
                             canvass_full = True
                             
-                            current_position_x = copy_interval + 50
-                            current_position_y = copy_interval + 50
-                            		        
-                            gimp.message("Flatten canvass")
-                            pdb.gimp_image_flatten(canvass)
-                            
-                            gimp.message("Set image resolution")
-                            pdb.gimp_image_set_resolution(canvass, img_resolution_x, img_resolution_y)
+                            current_position_x = copy_interval + sizes.margin_pixels(dpi)
+                            current_position_y = copy_interval + sizes.margin_pixels(dpi)
                     
                             # Save the image.
                             file_counter = file_counter + 1
-                            prefix = "doublespace_image" + "_" + str(file_counter)
-                            extension = ".jpg"
-                            filedate = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            filename = prefix + "_" + filedate + extension
-                            outputPath = outputFolder + "\\" + filename
-    
-                            #if(file.lower().endswith(('.png'))):
-                            #    pdb.file_png_save(canvass, canvass.layers[0], outputPath, outputPath, 0, 9, 0, 0, 0, 0, 0)
-                                
-                            #if(file.lower().endswith(('.jpeg', '.jpg'))):
-                            gimp.message("Save file")
-                            pdb.file_jpeg_save(canvass, canvass.layers[0], outputPath, outputPath, 0.9, 0, 0, 0, "Creating with GIMP", 0, 0, 0, 0)
+                            save_sheet(canvass, canvass_pool, namer, writer, dpi)
                             #del canvass
                             #Display resulting image
                             #display = pdb.gimp_display_new(canvass)
-                            pdb.gimp_image_delete(canvass)
-                            gimp.message("Deleted canvass image!")
                     
                     #del img_copy
                 #del image
-                pdb.gimp_image_delete(image)
-                gimp.message("Deleted image copy")
+                scratch.release(image)
                     
         except Exception as err:
+            metrics.unexpected(err)
+            gimp.message("Unexpected error: " + str(err))
+        finally:
+            progress.done(1, file_counter - sheets)
+
+    # The last sheet is saved even if it is not full, also when the run was
+    # cancelled or the last files were not placed
+    if not canvass_full:
+        try:
+            save_sheet(canvass, canvass_pool, namer, writer, dpi)
+            progress.done(0, 1)
+        except Exception as err:
+            metrics.unexpected(err)
             gimp.message("Unexpected error: " + str(err))
 
+    pdb.gimp_progress_end()
+    canvass_pool.close()
+    writer.close()
+
             
             
             
 
 
 
+# Function to read a picture file ahead, so that loading it later is served from the disk cache
+def prefetch_file(path):
+    if(path.lower().endswith(('.png', '.jpeg', '.jpg'))):
+        return read_ahead(path)
+    return 0
+
+# Function to flatten and save a sheet, and give its canvass back to the pool
+def save_sheet(canvass, canvass_pool, namer, writer, dpi):
+    pdb.gimp_image_flatten(canvass)
+    pdb.gimp_image_set_resolution(canvass, dpi, dpi)
+    outputPath = namer.next_path()
+    # Save to a temporary file; the sheet gets its name once it is complete
+    tempPath = writer.temp_path(outputPath)
+    with metrics.stage('encode', failure='encode'):
+        save_jpeg(canvass, tempPath)
+    outputPath = writer.publish(tempPath, namer.final_path(outputPath, tempPath))
+    metrics.sheet_written(outputPath)
+    # Lower resolutions if DOUBLESPACE_OUTPUTS is set
+    save_outputs(canvass, outputPath, writer, dpi)
+    canvass_pool.release(canvass)
+
 # Function to copy the original image
 def copy_orig_picture(image, layer):
     img_width = pdb.gimp_image_width(image)
     img_height = pdb.gimp_image_height(image)
-    image_copy = pdb.gimp_image_new(img_width,img_height, 0)
-    layer_copy = pdb.gimp_layer_new(image_copy,img_width,img_height,0,"default",100,0)
-    
-    pdb.gimp_image_add_layer(image_copy,layer_copy, -1)
-    pdb.gimp_edit_copy(layer)
-    selection = pdb.gimp_edit_paste(layer_copy,-1)
-    pdb.gimp_floating_sel_anchor(selection)
+    image_copy = scratch.image(pdb.gimp_image_new(img_width,img_height, 0))
+    # The layer is copied directly, not through the clipboard
+    copy_picture(layer, image_copy)
     
     #display = pdb.gimp_display_new(image_copy)
     
@@ -253,24 +295,26 @@ def copy_orig_picture(image, layer):
     
 # Function to resize the original image to the appropriate width / height (2x2 or 1x1)    
 def resize_picture(orig_image, new_width, new_height):
-    resized = pdb.gimp_image_scale(orig_image, new_width, new_height)
+    resized = scale_picture(orig_image, new_width, new_height)
     return orig_image
 
+# Function to make a new canvass with a white background layer
+def new_canvass(width, height):
+    canvass = scratch.image(pdb.gimp_image_new(width,height,0))
+    background = pdb.gimp_layer_new(canvass,width,height,0,"Background",100,0)
+    pdb.gimp_image_add_layer(canvass,background,-1)
+    pdb.gimp_drawable_fill(background,WHITE_FILL)
+    return canvass
+
+# Function to make a saved (flattened) canvass white again so it can be reused
+def clear_canvass(canvass):
+    pdb.gimp_drawable_fill(canvass.layers[0],WHITE_FILL)
+
 # Function to make additional copies of the resized images    
 def duplicate_picture(orig_image, canvass_image, xpos, ypos,img_width, img_height, name):
-    gimp.message("Set background to white")
-    pdb.gimp_context_set_background((255,255,255))
-    
-    gimp.message("Add new layer")
-    layer = pdb.gimp_layer_new(canvass_image,img_width,img_height,0,name,100,0)
-    pdb.gimp_image_add_layer(canvass_image,layer,-1)
-    pdb.gimp_selection_all(orig_image)
-    pdb.gimp_edit_copy(orig_image.layers[0])
-    gimp.message("Paste image")
-    selection = pdb.gimp_edit_paste(layer,-1)
-    pdb.gimp_floating_sel_anchor(selection)
-    gimp.message("Set image position")
-    pdb.gimp_layer_set_offsets(layer,xpos,ypos)
+    # The layer is copied directly, not through the clipboard
+    layer = place_picture(orig_image.layers[0], canvass_image, xpos, ypos, img_width, img_height)
+    pdb.gimp_item_set_name(layer, name)
     return layer
     
 from os.path import expanduser
@@ -297,6 +341,6 @@ register(
         #(PF_SLIDER, "blackPct", "Percentage of dark" , 0.2, (0.0,1.0,0.01))
     ],
     [],
-    layout)
+    entry_point(layout, "multi_images_2R", scratch=scratch))
 
 main()
@@ -0,0 +1,26 @@
+# Tests for the parts of the doublespace package that run without GIMP.
+# Run from the top folder: python -m pytest
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_picture(tmp_path):
+    ''' Return a function that saves a JPEG of width x height in tmp_path and
+    returns its path. '''
+    from PIL import Image
+
+    def make(name, width, height, color=(200, 120, 60)):
+        path = os.path.join(str(tmp_path), name)
+        image = Image.new('RGB', (width, height), color)
+        # A few bands, so the picture is not flat
+        for top in range(0, height, 40):
+            image.paste((color[2], color[0], color[1]), (0, top, width, min(height, top + 10)))
+        image.save(path, 'JPEG', quality=90)
+        return path
+    return make
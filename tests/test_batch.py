@@ -0,0 +1,50 @@
+import os
+
+from PIL import Image
+
+from doublespace.batch import run_orders
+from doublespace.orders import Order
+
+
+def test_run_orders(tmp_path, make_picture, monkeypatch):
+    for name in ('DOUBLESPACE_DPI', 'DOUBLESPACE_OUTPUTS', 'DOUBLESPACE_MAX_SHEET_SIZE',
+                 'DOUBLESPACE_PRINTER_PROFILE', 'DOUBLESPACE_QUALITY', 'DOUBLESPACE_SPOOL',
+                 'DOUBLESPACE_NAMING', 'DOUBLESPACE_ENCODERS', 'DOUBLESPACE_METRICS'):
+        monkeypatch.delenv(name, raising=False)
+    square = make_picture('square.jpg', 700, 700)
+    landscape = make_picture('landscape.jpg', 900, 640)
+    outputFolder = os.path.join(str(tmp_path), 'out')
+    os.makedirs(outputFolder)
+    orders = [Order(square, '1 x 1', '4R', 2),
+              Order(landscape, '2R', '5R', 1),
+              Order(landscape, '1 x 1', '4R', 1),
+              Order(os.path.join(str(tmp_path), 'missing.jpg'), '2R', '4R', 1)]
+    messages = []
+
+    saved, failed = run_orders(orders, outputFolder, log=messages.append, durability='none')
+
+    assert len(saved) == 3
+    assert sorted(os.listdir(outputFolder)) == sorted(os.path.basename(path) for path in saved)
+    sheet = Image.open(saved[0])
+    assert sheet.size == (1200, 1800)
+    # A copy of the picture at the first position, the paper white around it
+    assert sheet.getpixel((5, 5)) == (255, 255, 255)
+    assert sheet.getpixel((250, 200)) != (255, 255, 255)
+    assert Image.open(saved[2]).size == (1500, 2100)
+    # The landscape picture is no square, the last one does not exist
+    assert [order for order, message in failed] == orders[2:]
+    assert any('Saved' in message for message in messages)
+
+
+def test_run_orders_warns_about_sheets_too_large(tmp_path, make_picture, monkeypatch):
+    monkeypatch.delenv('DOUBLESPACE_ENCODERS', raising=False)
+    square = make_picture('square.jpg', 700, 700)
+    outputFolder = os.path.join(str(tmp_path), 'out')
+    os.makedirs(outputFolder)
+    messages = []
+
+    saved, failed = run_orders([Order(square, '1 x 1', '4R', 1)], outputFolder,
+                               log=messages.append, durability='none', max_bytes='1K')
+
+    assert len(saved) == 1 and not failed
+    assert any(message.startswith('Warning: ') and 'quality 40' in message for message in messages)
@@ -0,0 +1,28 @@
+import pytest
+
+from doublespace.budget import MemoryBudget, parse_size
+
+
+@pytest.mark.parametrize('text, size', [
+    ('1048576', 1048576),
+    ('512M', 512 << 20),
+    ('512mb', 512 << 20),
+    ('100K', 100 << 10),
+    ('2.5G', int(2.5 * (1 << 30))),
+    (' 2G ', 2 << 30),
+    (4096, 4096),
+])
+def test_parse_size(text, size):
+    assert parse_size(text) == size
+
+
+@pytest.mark.parametrize('text', ['abc', '', '2Q', 'M'])
+def test_parse_size_rejects_other_text(text):
+    with pytest.raises(ValueError):
+        parse_size(text)
+
+
+def test_budget_limit(monkeypatch):
+    monkeypatch.delenv('DOUBLESPACE_MEMORY_BUDGET', raising=False)
+    assert MemoryBudget().limit is None
+    assert MemoryBudget('1M').limit == 1 << 20
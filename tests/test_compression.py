@@ -0,0 +1,53 @@
+from doublespace.compression import (MIN_QUALITY, fit_quality, max_sheet_bytes, oversize_warning,
+                                     search_quality)
+
+
+def test_search_quality_finds_the_highest_that_fits():
+    assert search_quality(lambda quality: quality * 1000, 55000) == 55
+    assert search_quality(lambda quality: quality * 1000, 54999) == 54
+
+
+def test_search_quality_limits():
+    assert search_quality(lambda quality: quality * 1000, 10 ** 9) == 90
+    # Nothing fits: the lowest quality
+    assert search_quality(lambda quality: quality * 1000, 10) == MIN_QUALITY
+    assert search_quality(lambda quality: quality, 75, 70, 80) == 75
+
+
+def test_search_quality_tries_few_qualities():
+    tried = []
+
+    def size_at(quality):
+        tried.append(quality)
+        return quality * 1000
+    search_quality(size_at, 61000)
+    assert len(tried) <= 6
+
+
+def test_fit_quality():
+    def encode(quality):
+        return b'x' * (quality * 100)
+
+    def sample_size(quality):
+        return quality * 25
+    assert fit_quality(encode, sample_size, None, 90) == (b'x' * 9000, 90)
+    data, quality = fit_quality(encode, sample_size, 6000, 90)
+    assert quality == 60 and len(data) == 6000
+
+
+def test_fit_quality_saves_too_large_sheets_at_the_lowest_quality():
+    def encode(quality):
+        return b'x' * (quality * 100)
+
+    data, quality = fit_quality(encode, lambda quality: quality * 25, 1000, 90)
+    assert quality == MIN_QUALITY and len(data) > 1000
+    assert 'larger than the maximum' in oversize_warning('sheet.jpg', len(data), quality, 1000)
+    assert oversize_warning('sheet.jpg', 1000, 90, 1000) is None
+    assert oversize_warning('sheet.jpg', 10 ** 6, 90, None) is None
+
+
+def test_max_sheet_bytes(monkeypatch):
+    monkeypatch.delenv('DOUBLESPACE_MAX_SHEET_SIZE', raising=False)
+    assert max_sheet_bytes() is None
+    assert max_sheet_bytes('0') is None
+    assert max_sheet_bytes('2M') == 2 << 20
@@ -0,0 +1,64 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from doublespace.inputs import PictureArchive, PictureFolder, is_archive, open_pictures
+
+PICTURES = ('.jpg', '.jpeg', '.png')
+
+MEMBERS = {
+    'b.jpg': b'picture b',
+    'a.JPG': b'picture a',
+    'day1/c.png': b'picture c',
+    'notes.txt': b'not a picture',
+    '__MACOSX/._a.JPG': b'resource fork',
+    'day1/._c.png': b'resource fork',
+}
+
+
+def make_zip(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('day1/', b'')
+        for name, data in MEMBERS.items():
+            archive.writestr(name, data)
+
+
+def make_tar(path):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('name, make', [('set.zip', make_zip), ('set.tar.gz', make_tar)])
+def test_archive_pictures(tmp_path, name, make):
+    path = os.path.join(str(tmp_path), name)
+    make(path)
+    assert is_archive(path)
+    pictures = open_pictures(path)
+    assert isinstance(pictures, PictureArchive)
+    names = pictures.names(PICTURES)
+    # In member name order, without resource forks and other files
+    assert names == [os.path.join(path, 'a.JPG'), os.path.join(path, 'b.jpg'),
+                     os.path.join(path, 'day1', 'c.png')]
+    for picture, member in zip(names, ['a.JPG', 'b.jpg', 'day1/c.png']):
+        with pictures.open(picture) as f:
+            assert f.read() == MEMBERS[member]
+    pictures.close()
+
+
+def test_folder_pictures(tmp_path):
+    for name in ('b.jpg', 'a.png', 'notes.txt'):
+        with open(os.path.join(str(tmp_path), name), 'wb') as f:
+            f.write(name.encode('ascii'))
+    assert not is_archive(str(tmp_path))
+    pictures = open_pictures(str(tmp_path))
+    assert isinstance(pictures, PictureFolder)
+    names = pictures.names(PICTURES)
+    assert names == [os.path.join(str(tmp_path), 'a.png'), os.path.join(str(tmp_path), 'b.jpg')]
+    with pictures.open(names[1]) as f:
+        assert f.read() == b'b.jpg'
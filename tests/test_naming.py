@@ -0,0 +1,36 @@
+import os
+import re
+
+from doublespace.naming import SheetNamer, run_token
+
+
+def test_run_tokens_differ():
+    assert run_token() != run_token()
+    assert re.match('^[0-9a-f]{8}$', run_token())
+
+
+def test_sheet_paths_are_numbered(tmp_path):
+    namer = SheetNamer(str(tmp_path), content=False)
+    first, second = namer.next_path(), namer.next_path()
+    assert os.path.dirname(first) == str(tmp_path)
+    assert re.match(r'^doublespace_image_\d{8}_\d{6}_[0-9a-f]{8}_1\.jpg$', os.path.basename(first))
+    assert second == first[:-len('_1.jpg')] + '_2.jpg'
+
+
+def test_runs_do_not_collide(tmp_path):
+    assert SheetNamer(str(tmp_path), content=False).next_path() != \
+        SheetNamer(str(tmp_path), content=False).next_path()
+
+
+def test_content_names(tmp_path):
+    namer = SheetNamer(str(tmp_path), content=True)
+    path = namer.next_path(b'sheet')
+    assert path == namer.next_path(b'sheet')
+    assert path != namer.next_path(b'other sheet')
+    assert namer.next_path(b'sheet', 2) == path[:-len('.jpg')] + '_2.jpg'
+
+    saved = os.path.join(str(tmp_path), 'saved.jpg')
+    with open(saved, 'wb') as f:
+        f.write(b'sheet')
+    assert namer.final_path(saved) == path
+    assert SheetNamer(str(tmp_path), content=False).final_path(saved) == saved
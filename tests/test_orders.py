@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+from doublespace.orders import Order, read_orders
+
+
+def write(tmp_path, name, text):
+    path = os.path.join(str(tmp_path), name)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def test_csv_orders(tmp_path):
+    path = write(tmp_path, 'orders.csv',
+                 'Source, Picture, Paper ,copies\n'
+                 'photos/a.jpg,1x1,4r,2\n'
+                 '/abs/b.jpg,PH Passport,A4,\n')
+    orders = read_orders(path)
+    assert orders == [
+        Order(os.path.normpath(os.path.join(str(tmp_path), 'photos', 'a.jpg')), '1 x 1', '4R', 2),
+        Order(os.path.normpath('/abs/b.jpg'), 'PH Passport', 'A4', 1),
+    ]
+
+
+def test_json_orders(tmp_path):
+    rows = [{'path': 'a.jpg', 'picture_size': '2R', 'paper_size': '5R'}]
+    assert read_orders(write(tmp_path, 'o.json', json.dumps(rows))) == \
+        read_orders(write(tmp_path, 'p.json', json.dumps({'orders': rows})))
+    assert read_orders(write(tmp_path, 'o.json', json.dumps(rows)))[0].paper_size == '5R'
+
+
+@pytest.mark.parametrize('row, message', [
+    ('a.jpg,3x3,4R,1', 'Line 2: Unknown picture size: 3x3'),
+    ('a.jpg,1x1,B5,1', 'Line 2: Unknown paper size: B5'),
+    ('a.jpg,1x1,4R,0', 'Line 2: copies should be at least 1'),
+    ('a.jpg,1x1,4R,two', 'Line 2: '),
+    (',1x1,4R,1', 'Line 2: source, picture_size and paper_size are required'),
+])
+def test_bad_rows(tmp_path, row, message):
+    path = write(tmp_path, 'orders.csv', 'source,picture_size,paper_size,copies\n' + row + '\n')
+    with pytest.raises(ValueError) as err:
+        read_orders(path)
+    assert str(err.value).startswith(message)
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(IOError):
+        read_orders(os.path.join(str(tmp_path), 'missing.csv'))
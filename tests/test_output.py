@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from doublespace import output
+from doublespace.output import SheetWriter, durability_policy
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    ''' The paths fsync_path was called with. '''
+    paths = []
+    monkeypatch.setattr(output, 'fsync_path', paths.append)
+    return paths
+
+
+def test_write_publishes_the_sheet(tmp_path, synced):
+    writer = SheetWriter('none')
+    path = os.path.join(str(tmp_path), 'sheet.jpg')
+    assert writer.write(b'data', path) == path
+    with open(path, 'rb') as f:
+        assert f.read() == b'data'
+    assert os.listdir(str(tmp_path)) == ['sheet.jpg']
+    writer.close()
+    assert synced == []
+
+
+def test_publish_replaces_an_old_sheet(tmp_path, synced):
+    writer = SheetWriter('none')
+    path = os.path.join(str(tmp_path), 'sheet.jpg')
+    writer.write(b'old', path)
+    temp_path = writer.temp_path(path)
+    assert temp_path.startswith(path) and temp_path.endswith('.part')
+    with open(temp_path, 'wb') as f:
+        f.write(b'new')
+    writer.publish(temp_path, path)
+    with open(path, 'rb') as f:
+        assert f.read() == b'new'
+    assert not os.path.exists(temp_path)
+
+
+def test_file_durability_syncs_every_sheet(tmp_path, synced):
+    writer = SheetWriter('file')
+    path = os.path.join(str(tmp_path), 'sheet.jpg')
+    writer.write(b'data', path)
+    # The temporary file before the rename, the folder after it
+    assert len(synced) == 2 and synced[0].endswith('.part')
+    assert synced[1] == str(tmp_path)
+
+
+def test_batch_durability_syncs_at_close(tmp_path, synced):
+    writer = SheetWriter('batch')
+    paths = [os.path.join(str(tmp_path), name) for name in ('a.jpg', 'b.jpg')]
+    for path in paths:
+        writer.write(b'data', path)
+    assert synced == []
+    writer.close()
+    assert synced == paths + [str(tmp_path)]
+
+
+def test_close_removes_unpublished_files(tmp_path, synced):
+    writer = SheetWriter('none')
+    temp_path = writer.temp_path(os.path.join(str(tmp_path), 'sheet.jpg'))
+    with open(temp_path, 'wb') as f:
+        f.write(b'half a sheet')
+    writer.close()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_durability_policy(monkeypatch):
+    monkeypatch.delenv(output.DURABILITY_ENV, raising=False)
+    assert durability_policy() == 'batch'
+    assert durability_policy('FILE') == 'file'
+    with pytest.raises(ValueError):
+        durability_policy('always')
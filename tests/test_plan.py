@@ -0,0 +1,64 @@
+import pytest
+
+from doublespace import sizes
+from doublespace.plan import layout_plan, tile_positions
+
+
+# The copy loop of the baseline plugins (e.g. layout_multi_1x1.py), with its
+# 300 dpi constants: a gap of 50 pixels and an extra margin of 50 pixels
+def baseline_positions(canvass_width, canvass_height, copy_width, copy_height, start_y):
+    positions = []
+    copy_interval = 50
+    current_position_x = copy_interval + 50
+    current_position_y = start_y
+    while (1):
+        positions.append((current_position_x, current_position_y))
+        current_position_x = current_position_x + copy_width + copy_interval
+        if current_position_x > canvass_width - (copy_width + copy_interval):
+            current_position_x = copy_interval + 50
+            current_position_y = current_position_y + copy_height + copy_interval
+            if current_position_y > canvass_height - (copy_height + copy_interval):
+                break
+    return positions
+
+
+# (plugin, canvass size, copy size, first row) as in the baseline plugins
+BASELINE = [
+    ('layout_multi_1x1', (1200, 1800), (300, 300), 50),
+    ('layout_multi_15x15', (1200, 1800), (450, 450), 100),
+    ('layout_multi_phpassport', (1200, 1800), (411, 531), 50),
+    ('layout_anymulti 2 x 2 on A4', (2481, 3507), (600, 600), 50),
+    ('layout_anymulti 1 x 1 on 5R', (1500, 2100), (300, 300), 50),
+    ('layout_2R on 4R', (1200, 1800), (1050, 750), 100),
+    ('layout_2R on Letter', (2550, 3300), (1050, 750), 100),
+]
+
+
+@pytest.mark.parametrize('plugin, canvass, copy, start_y', BASELINE, ids=[case[0] for case in BASELINE])
+def test_tile_positions_match_baseline_loops(plugin, canvass, copy, start_y):
+    expected = baseline_positions(canvass[0], canvass[1], copy[0], copy[1], start_y)
+    assert tile_positions(canvass[0], canvass[1], copy[0], copy[1],
+                          100, start_y, copy[0] + 50, 50) == expected
+
+
+@pytest.mark.parametrize('picture, paper, start_y', [
+    ('1 x 1', '4R', 50),
+    ('2 x 2', 'A4', 50),
+    ('PH Passport', '5R', 50),
+    ('2R', '4R', 100),
+    ('2R', 'Letter', 100),
+])
+def test_layout_plan_at_300_dpi_matches_baseline(picture, paper, start_y):
+    plan = layout_plan(picture, paper, 300)
+    canvass = sizes.paper_sizes[paper]
+    copy = sizes.picture_sizes[picture]
+    assert plan.positions == baseline_positions(canvass['width'], canvass['height'],
+                                                copy['width'], copy['height'], start_y)
+    assert plan.keep_aspect == (picture == '2R')
+
+
+def test_layout_plan_at_600_dpi_has_the_same_copies():
+    low = layout_plan('1 x 1', '4R', 300)
+    high = layout_plan('1 x 1', '4R', 600)
+    assert len(high.positions) == len(low.positions)
+    assert high.positions == [(x * 2, y * 2) for x, y in low.positions]
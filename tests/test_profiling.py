@@ -0,0 +1,34 @@
+import json
+import multiprocessing
+import os
+
+from doublespace.profiling import TOTALS_FILE, _add_totals, profile_run
+
+
+def add_totals(outputFolder):
+    for run in range(20):
+        _add_totals(outputFolder, 'layout', 0.5)
+
+
+def test_add_totals_from_many_processes(tmp_path):
+    outputFolder = str(tmp_path)
+    processes = [multiprocessing.Process(target=add_totals, args=(outputFolder,)) for n in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with open(os.path.join(outputFolder, TOTALS_FILE)) as f:
+        totals = json.load(f)
+    assert totals['layout']['runs'] == 80
+    assert totals['layout']['seconds'] == 40.0
+    assert [name for name in os.listdir(outputFolder) if name.endswith('.tmp')] == []
+
+
+def test_profile_run_reports_files_it_can_not_write(tmp_path, capsys):
+    outputFolder = os.path.join(str(tmp_path), 'missing')
+
+    with profile_run('layout', outputFolder, 'sample'):
+        pass
+
+    assert 'Could not write profile to ' + outputFolder in capsys.readouterr().err
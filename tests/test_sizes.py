@@ -0,0 +1,46 @@
+import pytest
+
+from doublespace import sizes
+
+
+def test_pixels_at_300_dpi_are_the_plugin_values():
+    assert sizes.paper_pixels('4R', 300) == (1200, 1800)
+    assert sizes.paper_pixels('5R', 300) == (1500, 2100)
+    assert sizes.paper_pixels('A4', 300) == (2481, 3507)
+    assert sizes.paper_pixels('Letter', 300) == (2550, 3300)
+    assert sizes.picture_pixels('1 x 1', 300) == (300, 300)
+    assert sizes.picture_pixels('PH Passport', 300) == (411, 531)
+    assert sizes.picture_pixels('2R', 300) == (1050, 750)
+    assert sizes.gutter_pixels(300) == 50
+    assert sizes.margin_pixels(300) == 50
+    assert sizes.gutter_2x2_pixels(300) == 75
+    assert sizes.gutter_1x1_pixels(300) == 25
+
+
+def test_pixels_at_600_dpi_are_doubled():
+    assert sizes.paper_pixels('4R', 600) == (2400, 3600)
+    assert sizes.paper_pixels('A4', 600) == (4962, 7014)
+    assert sizes.picture_pixels('1.5 x 1.5', 600) == (900, 900)
+    assert sizes.picture_pixels('PH Passport', 600) == (822, 1062)
+    assert sizes.gutter_pixels(600) == 100
+    assert sizes.margin_pixels(600) == 100
+    assert sizes.gutter_2x2_pixels(600) == 150
+    assert sizes.gutter_1x1_pixels(600) == 50
+
+
+def test_names_are_matched_loosely():
+    assert sizes.paper_name('a4') == 'A4'
+    assert sizes.picture_name('1x1') == '1 x 1'
+    assert sizes.picture_name('ph passport') == 'PH Passport'
+    with pytest.raises(ValueError):
+        sizes.picture_name('3x3')
+
+
+def test_sheet_dpi(monkeypatch):
+    monkeypatch.delenv(sizes.DPI_ENV, raising=False)
+    assert sizes.sheet_dpi() == 300
+    monkeypatch.setenv(sizes.DPI_ENV, '600')
+    assert sizes.sheet_dpi() == 600
+    assert sizes.sheet_dpi(150) == 150
+    with pytest.raises(ValueError):
+        sizes.sheet_dpi(0)